@@ -0,0 +1,337 @@
+'''Benchmark scenarios for the provide python client against local stand-in servers.
+
+Run from the repository root, e.g.:
+
+    python -m benchmarks.run --latency 0.002 --output bench.json
+
+Each scenario reports ops/sec, p50/p99 latency in milliseconds and the peak
+memory traced by tracemalloc during one additional iteration, as JSON.
+'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import jwt
+
+from benchmarks.standin import APPLICATION_ID, StandInServer
+
+SERVERS = {}
+SCENARIOS = ['startup', 'message_bus', 'publish', 'paginate', 'detail_burst', 'throttled_burst', 'tail_latency', 'compression']
+
+
+def standin_token():
+    '''Return an unsigned-in-practice JWT whose subject is the stand-in message bus application.'''
+    token = jwt.encode({'sub': 'application:{}'.format(APPLICATION_ID)}, 'standin')
+    return token.decode('utf-8') if isinstance(token, bytes) else token
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def measure(scenario, fn, iterations, ops_per_iteration=1, **params):
+    '''Time iterations calls of fn after one warm-up call, then trace the peak memory of one more call.'''
+    fn()
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = {
+        'scenario': scenario,
+        'params': params,
+        'iterations': iterations,
+        'ops_per_sec': iterations * ops_per_iteration / elapsed,
+        'p50_ms': percentile(samples, 0.5) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'peak_memory_bytes': peak,
+    }
+    sys.stderr.write('{scenario} {params}: {ops_per_sec:.1f} ops/sec; p50 {p50_ms:.2f} ms; p99 {p99_ms:.2f} ms\n'.format(**result))
+    return result
+
+
+def bench_startup(args, token):
+    from prvd.message_bus import MessageBus
+
+    def import_message_bus():
+        subprocess.check_call([sys.executable, '-c', 'import prvd.message_bus'])
+
+    results = [measure('startup', import_message_bus, max(1, args.iterations // 10), phase='interpreter_and_import')]
+    for resolution in (MessageBus.RESOLUTION_EAGER, MessageBus.RESOLUTION_LAZY, MessageBus.RESOLUTION_BACKGROUND):
+        buses = []
+        try:
+            results.append(measure('startup', lambda: buses.append(MessageBus(token, '0x0', resolution=resolution)),
+                                   args.iterations, phase='construct', resolution=resolution))
+        finally:
+            for bus in buses:
+                bus.close()
+    return results
+
+
+def bench_message_bus(args, token):
+    from prvd.message_bus import MessageBus
+
+    def construct():
+        MessageBus(token, '0x0').close()
+
+    return [measure('message_bus', construct, args.iterations, contracts=args.contracts)]
+
+
+def bench_publish(args, token):
+    from prvd.message_bus import MessageBus
+
+    bus = MessageBus(token, '0x0', publish_workers=args.concurrency)
+    try:
+        results = []
+        for size in args.sizes:
+            payload = os.urandom(size)
+
+            def pipelined():
+                for _ in range(args.burst):
+                    bus.submit_message('benchmark', payload)
+                bus.flush()
+
+            results.append(measure('publish', lambda: bus.publish_message('benchmark', payload), args.iterations,
+                                   size=size, mode='serial', ipfs_nodes=args.ipfs_nodes))
+            results.append(measure('publish', pipelined, max(1, args.iterations // 10), ops_per_iteration=args.burst,
+                                   size=size, mode='pipelined', ipfs_nodes=args.ipfs_nodes))
+        return results
+    finally:
+        bus.close()
+
+
+def bench_paginate(args, token):
+    from prvd.goldmine import Goldmine
+
+    client = Goldmine(token)
+    try:
+        def walk():
+            for _ in client.iter_network_transactions('benchmark', {}, rpp=args.rpp):
+                pass
+
+        return [measure('paginate', walk, max(1, args.iterations // 10), ops_per_iteration=args.total,
+                        total=args.total, rpp=args.rpp, item_size=args.item_size)]
+    finally:
+        client.close()
+
+
+def bench_detail_burst(args, token):
+    from prvd.goldmine import Goldmine
+
+    client = Goldmine(token)
+    ids = ['{:012x}'.format(i) for i in range(args.burst)]
+    try:
+        def serial():
+            for id in ids:
+                client.fetch_transaction_details(id)
+
+        def concurrent():
+            client.fetch_many_transactions(ids, concurrency=args.concurrency)
+
+        iterations = max(1, args.iterations // 10)
+        return [
+            measure('detail_burst', serial, iterations, ops_per_iteration=args.burst, burst=args.burst, concurrency=1),
+            measure('detail_burst', concurrent, iterations, ops_per_iteration=args.burst, burst=args.burst, concurrency=args.concurrency),
+        ]
+    finally:
+        client.close()
+
+
+def bench_throttled_burst(args, token):
+    from concurrent.futures import ThreadPoolExecutor
+    from prvd.goldmine import Goldmine
+    from prvd.scheduler import Scheduler
+
+    goldmine = SERVERS['goldmine']
+    goldmine.config['rate'] = args.rate_limit
+    executor = ThreadPoolExecutor(args.concurrency)
+    results = []
+    try:
+        for scheduled in (False, True):
+            client = Goldmine(token, scheduler=Scheduler() if scheduled else None)
+            statuses = []
+
+            def burst():
+                statuses.extend(executor.map(lambda i: client.execute_contract('benchmark', {'i': i})[0], range(args.burst)))
+
+            try:
+                result = measure('throttled_burst', burst, max(1, args.iterations // 10), ops_per_iteration=args.burst,
+                                 burst=args.burst, rate_limit=args.rate_limit, scheduled=scheduled)
+                result['rejected'] = statuses.count(429)
+                results.append(result)
+            finally:
+                client.close()
+        return results
+    finally:
+        goldmine.config['rate'] = 0
+        executor.shutdown()
+
+
+def bench_tail_latency(args, token):
+    from prvd.goldmine import Goldmine
+    from prvd.hedging import HedgePolicy
+
+    goldmine = SERVERS['goldmine']
+    goldmine.config.update(tail_latency=args.tail_latency, tail_ratio=args.tail_ratio)
+    results = []
+    try:
+        for hedged in (False, True):
+            hedging = HedgePolicy() if hedged else None
+            client = Goldmine(token, hedging=hedging)
+            try:
+                results.append(measure('tail_latency', lambda: client.fetch_contract_details('benchmark'), args.iterations * 10,
+                                       tail_latency=args.tail_latency, tail_ratio=args.tail_ratio, hedged=hedged))
+            finally:
+                client.close()
+                if hedging != None:
+                    hedging.close()
+        return results
+    finally:
+        goldmine.config.update(tail_latency=0.0, tail_ratio=0.0)
+
+
+def contract_payload(size):
+    '''Return contract execution params of roughly the given encoded size, shaped like an ABI with random addresses.'''
+    params, encoded = [], 2
+    while encoded < size:
+        entry = {'name': 'method{}'.format(len(params)), 'type': 'function', 'stateMutability': 'nonpayable',
+                 'inputs': [{'name': 'to', 'type': 'address', 'value': '0x{}'.format(os.urandom(20).hex())}],
+                 'outputs': [{'name': '', 'type': 'bool'}]}
+        params.append(entry)
+        encoded += len(json.dumps(entry)) + 2
+    return {'method': 'deploy', 'params': params}
+
+
+def bench_compression(args, token):
+    from prvd.goldmine import Goldmine
+    from prvd.metrics import MetricsAggregator
+
+    goldmine = SERVERS['goldmine']
+    goldmine.config['bandwidth'] = args.bandwidth
+    payload = contract_payload(args.payload_size)
+    results = []
+    try:
+        for threshold in args.compression_thresholds:
+            goldmine.config['compress_min'] = threshold if threshold != None else 0
+            metrics = MetricsAggregator()
+            client = Goldmine(token, compression_threshold=threshold, metrics=metrics)
+            try:
+                for scenario, fn in (('execute', lambda: client.execute_contract('benchmark', payload)),
+                                     ('list', lambda: client.fetch_network_transactions('benchmark', {'rpp': args.rpp}))):
+                    received, sent = goldmine.bytes_received, goldmine.bytes_sent
+                    iterations = max(1, args.iterations // 10)
+                    result = measure('compression', fn, iterations, operation=scenario, threshold=threshold,
+                                     bandwidth=args.bandwidth, payload_size=args.payload_size)
+                    # measure() makes a warm-up and a traced call besides the timed iterations
+                    wire_bytes = goldmine.bytes_received - received + goldmine.bytes_sent - sent
+                    result['wire_bytes_per_op'] = wire_bytes // (iterations + 2)
+                    results.append(result)
+                result['compression'] = metrics.snapshot()['compression']
+            finally:
+                client.close()
+        return results
+    finally:
+        goldmine.config.update(bandwidth=0, compress_min=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated scenarios to run')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds of latency injected per request')
+    parser.add_argument('--contracts', type=int, default=10, help='contracts listed for the message bus application')
+    parser.add_argument('--sizes', default='1024,65536,1048576', help='comma-separated publish message sizes in bytes')
+    parser.add_argument('--total', type=int, default=1000, help='items in each paginated list')
+    parser.add_argument('--rpp', type=int, default=100, help='items per page')
+    parser.add_argument('--item-size', type=int, default=256, help='bytes of payload per list or detail item')
+    parser.add_argument('--burst', type=int, default=100, help='detail fetches per burst')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrency of bulk detail fetches and pipelined publishes')
+    parser.add_argument('--ipfs-nodes', type=int, default=1, help='IPFS connectors listed for the message bus application')
+    parser.add_argument('--ipfs-capacity', type=int, default=0, help='requests each IPFS stand-in serves concurrently; 0 for unlimited')
+    parser.add_argument('--rate-limit', type=int, default=200, help='requests per second admitted by the stand-in Goldmine in throttled bursts')
+    parser.add_argument('--tail-latency', type=float, default=0.1, help='seconds of latency added to a tail of stand-in Goldmine requests')
+    parser.add_argument('--tail-ratio', type=float, default=0.02, help='ratio of stand-in Goldmine requests delayed by --tail-latency')
+    parser.add_argument('--compression-thresholds', default='none,1024',
+                        help='comma-separated request compression thresholds in bytes; none disables compression')
+    parser.add_argument('--payload-size', type=int, default=65536, help='bytes of contract execution params in the compression scenario')
+    parser.add_argument('--bandwidth', type=int, default=0, help='bytes per second at which the stand-in Goldmine transfers bodies; 0 for unlimited')
+    parser.add_argument('--output', default=None, help='write JSON results to this file instead of stdout')
+    args = parser.parse_args(argv)
+    args.sizes = [int(size) for size in args.sizes.split(',')]
+    args.compression_thresholds = [int(t) if t != 'none' else None for t in args.compression_thresholds.split(',')]
+    logging.basicConfig(level=logging.ERROR)
+
+    servers = dict((name, StandInServer(latency=args.latency, total=args.total, item_size=args.item_size, contracts=args.contracts,
+                                        capacity=args.ipfs_capacity if name.startswith('ipfs') else 0).start())
+                   for name in ['goldmine', 'ident'] + ['ipfs-{}'.format(i) for i in range(args.ipfs_nodes)])
+    SERVERS.update(servers)
+    for server in servers.values():
+        server.config['ipfs_api_urls'] = ['http://{}'.format(servers['ipfs-{}'.format(i)].host) for i in range(args.ipfs_nodes)]
+    os.environ.update({
+        'GOLDMINE_API_SCHEME': 'http',
+        'GOLDMINE_API_HOST': servers['goldmine'].host,
+        'IDENT_API_SCHEME': 'http',
+        'IDENT_API_HOST': servers['ident'].host,
+    })
+
+    token = standin_token()
+    results = []
+    try:
+        for scenario in args.scenarios.split(','):
+            results.extend(globals()['bench_{}'.format(scenario)](args, token))
+    finally:
+        for server in servers.values():
+            server.stop()
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+        },
+        'config': dict((k, v) for k, v in vars(args).items() if k != 'output'),
+        'results': results,
+    }
+    if args.output != None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
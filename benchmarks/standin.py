@@ -0,0 +1,328 @@
+'''Local stand-in Goldmine, Ident and IPFS servers for benchmarking.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import contextlib
+import gzip
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+APPLICATION_ID = '00000000-0000-0000-0000-000000000001'
+REGISTRY_CONTRACT_ID = '00000000-0000-0000-0000-000000000002'
+IPFS_CONNECTOR_ID = '00000000-0000-0000-0000-000000000003'
+IPFS_VERSION = '0.7.0'
+
+
+def connector_id(index):
+    '''Return the id of the IPFS connector with the given index; the first is IPFS_CONNECTOR_ID.'''
+    return IPFS_CONNECTOR_ID if index == 0 else '00000000-0000-0000-0003-{:012x}'.format(index)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    '''Serves the Goldmine, Ident and IPFS endpoints used by the package.'''
+
+    disable_nagle_algorithm = True
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.__handle__('GET', None)
+
+    def do_POST(self):
+        self.__handle__('POST', self.__read_body__())
+
+    def do_PUT(self):
+        self.__handle__('PUT', self.__read_body__())
+
+    def do_DELETE(self):
+        self.__handle__('DELETE', None)
+
+    def __handle__(self, method, body):
+        with self.server.capacity:
+            self.__respond__(method, body)
+
+    def __respond__(self, method, body):
+        config = self.server.config
+        if config['latency'] > 0:
+            time.sleep(config['latency'])
+        if config['tail_ratio'] > 0 and random.random() < config['tail_ratio']:
+            time.sleep(config['tail_latency'])
+        if config['error_ratio'] > 0 and random.random() < config['error_ratio']:
+            return self.__send__(503, {'error': 'service unavailable'})
+        if config['rate'] > 0 and not self.server.admit():
+            return self.__send__(429, {'error': 'rate limit exceeded'}, {'retry-after': '1'})
+        url = urlparse(self.path)
+        query = dict((k, v[-1]) for k, v in parse_qs(url.query).items())
+        path = url.path.strip('/')
+        with self.server.lock:
+            self.server.requests += 1
+
+        if path.startswith('api/v0/'):
+            return self.__ipfs__(path[len('api/v0/'):], query, body)
+        if not path.startswith('api/v1/'):
+            return self.__send__(404, {'error': 'not found'})
+        self.__api__(method, path[len('api/v1/'):], query, body)
+
+    def __api__(self, method, path, query, body):
+        config = self.server.config
+        segments = path.split('/')
+        if config['token_ttl'] > 0:
+            if method == 'POST' and path in ('authenticate', 'tokens'):
+                return self.__send__(201, self.server.issue_token())
+            if not self.server.authorized(self.headers.get('authorization', '')):
+                return self.__send__(401, {'error': 'unauthorized'})
+        if method == 'POST' and len(segments) == 3 and segments[0] == 'contracts' and segments[2] == 'execute':
+            ref = hashlib.sha1(body).hexdigest()
+            with self.server.lock:
+                self.server.transactions.insert(0, {
+                    'id': '{:032x}'.format(len(self.server.transactions)),
+                    'to': '0x0',
+                    'status': 'success',
+                    'params': json.loads(body.decode('utf-8')),
+                    'ref': ref,
+                })
+            return self.__send__(202, {'ref': ref})
+        if method in ('POST', 'PUT'):
+            return self.__send__(201 if method == 'POST' else 204, json.loads(body.decode('utf-8') or 'null'))
+        if method == 'DELETE':
+            return self.__send__(204, None)
+
+        if segments[0] == 'applications' and len(segments) == 2:
+            return self.__send__(200, {'id': segments[1], 'config': {'type': 'message_bus'}})
+        if segments[0] == 'contracts' and len(segments) == 1:
+            ids = ['{:08x}-0000-0000-0000-000000000000'.format(i) for i in range(config['contracts'] - 1)]
+            return self.__send__(200, [{'id': id} for id in ids + [REGISTRY_CONTRACT_ID]])
+        if segments[0] == 'contracts' and len(segments) == 2:
+            contract_type = 'registry' if segments[1] == REGISTRY_CONTRACT_ID else 'erc20'
+            return self.__send__(200, {'id': segments[1], 'address': '0x0', 'params': {'type': contract_type}})
+        if segments[0] == 'transactions' and len(segments) == 1:
+            page = int(query.get('page', 1))
+            rpp = int(query.get('rpp', config['total']))
+            with self.server.lock:
+                transactions = self.server.transactions[(page - 1) * rpp:page * rpp]
+                total = len(self.server.transactions)
+            return self.__send__(200, transactions, {'x-total-results-count': str(total)})
+        if segments[0] == 'connectors' and len(segments) == 1:
+            return self.__send__(200, [{'id': connector_id(i)} for i in range(len(config['ipfs_api_urls']))])
+        if segments[0] == 'connectors' and len(segments) == 2:
+            ids = [connector_id(i) for i in range(len(config['ipfs_api_urls']))]
+            return self.__send__(200, {
+                'id': segments[1],
+                'type': 'ipfs',
+                'config': {'api_url': config['ipfs_api_urls'][ids.index(segments[1])]},
+            })
+        if len(segments) % 2 == 1:
+            return self.__list__(path, query)
+        self.__send__(200, self.__item__(path, segments[-1]))
+
+    def __list__(self, path, query):
+        config = self.server.config
+        page = int(query.get('page', 1))
+        rpp = int(query.get('rpp', config['total']))
+        start = min((page - 1) * rpp, config['total'])
+        end = min(start + rpp, config['total'])
+        items = [self.__item__(path, '{:012x}'.format(i)) for i in range(start, end)]
+        self.__send__(200, items, {'x-total-results-count': str(config['total'])})
+
+    def __item__(self, path, id):
+        return {
+            'id': id,
+            'path': path,
+            'created_at': '2022-01-01T00:00:00Z',
+            'data': '{:0{}x}'.format(random.getrandbits(4 * self.server.config['item_size']), self.server.config['item_size']),
+        }
+
+    def __ipfs__(self, command, query, body):
+        if command == 'version':
+            return self.__send__(200, {'Version': IPFS_VERSION, 'Commit': '', 'Repo': '10', 'System': 'standin', 'Golang': ''})
+        if command == 'add':
+            content = body[body.index(b'\r\n\r\n') + 4:body.rindex(b'\r\n--')]
+            digest = hashlib.sha256(content).hexdigest()
+            msghash = 'Qm{}'.format(digest[:44])
+            self.server.blobs[msghash] = content
+            return self.__send__(200, {'Name': digest, 'Hash': msghash, 'Size': str(len(content))})
+        if command == 'cat':
+            content = self.server.blobs.get(query.get('arg', None), None)
+            if content == None:
+                return self.__send__(500, {'Message': 'blob not found', 'Code': 0, 'Type': 'error'})
+            offset = int(query.get('offset', 0))
+            length = int(query['length']) if 'length' in query else len(content)
+            content = content[offset:offset + length]
+            self.send_response(200)
+            self.send_header('content-type', 'text/plain')
+            self.send_header('content-length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+        self.__send__(404, {'Message': 'unknown command: {}'.format(command)})
+
+    def __read_body__(self):
+        if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            body = b''.join(chunks)
+        else:
+            body = self.rfile.read(int(self.headers.get('content-length', 0)))
+        self.server.transfer(len(body), 0)
+        if self.headers.get('content-encoding', '').lower() == 'gzip':
+            body = gzip.decompress(body)
+        return body
+
+    def __send__(self, status, obj, headers=None):
+        body = json.dumps(obj).encode('utf-8') if obj != None else b''
+        compress_min = self.server.config['compress_min']
+        compress = compress_min > 0 and len(body) >= compress_min and 'gzip' in self.headers.get('accept-encoding', '')
+        if compress:
+            body = gzip.compress(body, 6)
+        self.server.transfer(0, len(body))
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        if compress:
+            self.send_header('content-encoding', 'gzip')
+        self.send_header('content-length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(ThreadingHTTPServer):
+    '''Threaded HTTP server which serves StandInHandler on a free local port.
+
+    latency is injected before every response, total and item_size control the
+    length of list responses and the size of each item, contracts is the
+    number of contracts listed for the message bus application, capacity,
+    if non-zero, limits the number of requests served concurrently and rate,
+    if non-zero, limits the requests admitted per second, answering excess
+    requests with 429 responses. If token_ttl is non-zero, requests bearing
+    an expired token are answered with 401 responses and tokens expiring
+    after token_ttl seconds are issued by authenticate and tokens. If
+    compress_min is non-zero, JSON responses of at least compress_min bytes
+    are gzip-encoded for clients which accept it; gzip-encoded request bodies are decoded, and bandwidth,
+    if non-zero, limits the bytes per second each request body and JSON
+    response is transferred at. A tail_ratio of requests are delayed by a
+    further tail_latency, and an error_ratio of requests answered with 503
+    responses.
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, total=1000, item_size=256, contracts=10, capacity=0, rate=0,
+                 tail_latency=0.0, tail_ratio=0.0, error_ratio=0.0, token_ttl=0,
+                 compress_min=0, bandwidth=0):
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.config = {
+            'latency': latency,
+            'total': total,
+            'item_size': item_size,
+            'contracts': contracts,
+            'rate': rate,
+            'tail_latency': tail_latency,
+            'tail_ratio': tail_ratio,
+            'error_ratio': error_ratio,
+            'token_ttl': token_ttl,
+            'compress_min': compress_min,
+            'bandwidth': bandwidth,
+            'ipfs_api_urls': ['http://127.0.0.1:{}'.format(self.server_port)],
+        }
+        self.blobs = {}
+        self.transactions = []
+        self.lock = threading.Lock()
+        self.capacity = threading.BoundedSemaphore(capacity) if capacity > 0 else contextlib.nullcontext()
+        self.requests = 0
+        self.admitted = []
+        self.tokens_issued = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.thread = None
+
+    def admit(self):
+        '''Return True if a request may be admitted within the configured rate.'''
+        now = time.time()
+        with self.lock:
+            self.admitted = [t for t in self.admitted if t > now - 1]
+            if len(self.admitted) >= self.config['rate']:
+                return False
+            self.admitted.append(now)
+            return True
+
+    def transfer(self, received, sent):
+        '''Count the given body bytes received and sent, delaying by the time they take at the configured bandwidth.'''
+        with self.lock:
+            self.bytes_received += received
+            self.bytes_sent += sent
+        if self.config['bandwidth'] > 0:
+            time.sleep((received + sent) / self.config['bandwidth'])
+
+    def authorized(self, authorization):
+        '''Return True if the given authorization header bears a token which has not expired.'''
+        import jwt
+
+        try:
+            claims = jwt.decode(authorization[len('bearer '):], 'standin', algorithms=['HS256'],
+                                options={'verify_exp': False})
+        except jwt.InvalidTokenError:
+            return False
+        return claims.get('exp', None) == None or claims['exp'] > time.time()
+
+    def issue_token(self):
+        '''Issue an access token expiring after token_ttl seconds.'''
+        import jwt
+
+        now = time.time()
+        with self.lock:
+            self.tokens_issued += 1
+        token = jwt.encode({'sub': 'application:{}'.format(APPLICATION_ID), 'iat': now, 'exp': now + self.config['token_ttl']}, 'standin')
+        return {
+            'access_token': token.decode('utf-8') if isinstance(token, bytes) else token,
+            'refresh_token': 'standin-refresh-token',
+            'expires_in': self.config['token_ttl'],
+        }
+
+    def handle_error(self, request, client_address):
+        # clients which time out or cancel hedged requests close their connections early
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            ThreadingHTTPServer.handle_error(self, request, client_address)
+
+    @property
+    def host(self):
+        return '127.0.0.1:{}'.format(self.server_port)
+
+    def start(self):
+        '''Serve requests on a background thread.'''
+        self.thread = threading.Thread(target=self.serve_forever, name='prvd-standin-{}'.format(self.server_port))
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        '''Stop serving and close the listening socket.'''
+        self.shutdown()
+        self.server_close()
@@ -14,4 +14,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-__all__ = ['api_client', 'goldmine', 'ident', 'message_bus']
+__all__ = ['api_client', 'async_api_client', 'async_goldmine', 'async_ident', 'async_message_bus',
+           'async_subscription', 'batch_publisher', 'blob_cache', 'cache_files', 'codec', 'connector_pool', 'envelope',
+           'goldmine', 'hedging', 'ident', 'message_bus', 'metrics', 'network_follower', 'publisher', 'records',
+           'resolution_cache', 'response_cache', 'scheduler', 'subscription', 'token_provider']
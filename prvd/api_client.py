@@ -14,56 +14,351 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-import json
 import os
-import requests
+import threading
+import time
+import zlib
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from .codec import DEFAULT_CODEC, iter_json_array
+from .metrics import NULL_METRICS, endpoint_template
+from .token_provider import token_provider
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def acquire_session(scheme, host, pool_size):
+    '''Acquire a reference to the shared, pooled HTTP session for the given scheme and host.
+
+    The pool holds the largest pool_size requested by any client of the session.
+    '''
+    # requests is imported on first use so importing the package stays cheap
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    key = (scheme, host)
+    with _sessions_lock:
+        entry = _sessions.get(key, None)
+        if entry == None:
+            session = requests.Session()
+            session.headers.update({'connection': 'keep-alive'})
+            entry = _sessions[key] = [session, 0, 0]
+        if pool_size > entry[2]:
+            prefix = '{}://'.format(scheme)
+            previous = entry[0].adapters.get(prefix, None) if entry[2] > 0 else None
+            entry[0].mount(prefix, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+            entry[2] = pool_size
+            if previous != None:
+                # in-flight requests complete on the previous adapter; only its idle connections are closed
+                previous.close()
+        entry[1] += 1
+        return entry[0]
+
+
+def release_session(scheme, host):
+    '''Release a reference to the shared HTTP session for the given scheme and host; the last reference closes its pool.'''
+    key = (scheme, host)
+    with _sessions_lock:
+        entry = _sessions.get(key, None)
+        if entry == None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del _sessions[key]
+            entry[0].close()
+
+
+def gzip_body(body, level):
+    '''Return the given request body gzip-encoded at the given compression level.'''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(body) + compressor.flush()
+
+
+def connection_reused(r):
+    '''Return whether the connection of the given streamed response served an earlier request, or None if unknown.'''
+    conn = getattr(r.raw, '_connection', None)
+    if conn == None:
+        return None
+    served = getattr(conn, 'prvd_requests_served', 0)
+    conn.prvd_requests_served = served + 1
+    return served > 0
 
 
 class APIClient(object):
 
     DEFAULT_SCHEME = 'https'
     DEFAULT_VERSION = 'v1'
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_CONNECT_TIMEOUT = 10
+    DEFAULT_READ_TIMEOUT = 30
+    DEFAULT_FETCH_CONCURRENCY = 16
+    DEFAULT_RPP = 100
+    DEFAULT_STREAM_CHUNK_SIZE = 65536
+    DEFAULT_COMPRESSION_LEVEL = 6
+    TOTAL_RESULTS_COUNT_HEADER = 'x-total-results-count'
 
-    def __init__(self, scheme, host, token):
+    def __init__(self, scheme, host, token,
+                 pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout=DEFAULT_READ_TIMEOUT,
+                 response_cache=None,
+                 metrics=None,
+                 codec=None,
+                 scheduler=None,
+                 priority=None,
+                 hedging=None,
+                 compression_threshold=None,
+                 compression_level=DEFAULT_COMPRESSION_LEVEL):
         self.base_url = '{}://{}/api/{}'.format(scheme, host, APIClient.DEFAULT_VERSION)
-        self.token = token
+        self.scheme = scheme
+        self.host = host
+        self.tokens = token_provider(token)
+        self.timeout = self.__timeout__(connect_timeout, read_timeout)
+        self.response_cache = response_cache
+        self.metrics = metrics if metrics != None else NULL_METRICS
+        self.codec = codec if codec != None else DEFAULT_CODEC
+        self.scheduler = scheduler
+        self.priority = priority
+        self.hedging = hedging
+        self.compression_threshold = compression_threshold
+        self.compression_level = compression_level
+        self.pool_size = pool_size
+        self.session = self.__acquire_session__(scheme, host, pool_size)
+
+    @property
+    def token(self):
+        '''The current bearer token, supplied by the client's TokenProvider.'''
+        return self.tokens.token() if self.tokens != None else None
+
+    @token.setter
+    def token(self, token):
+        self.tokens = token_provider(token)
+
+    def close(self):
+        '''Release this client's reference to the shared HTTP connection pool.'''
+        if self.session != None:
+            self.session = None
+            release_session(self.scheme, self.host)
 
     def get(self, uri, params):
-        r = requests.get('{}/{}'.format(self.base_url, uri), headers=self.__headers__(), params=params)
-        response = r.text
-        if r.status_code == 200 and r.headers['content-type'].find('application/json') == 0:
-            response = r.json()
-        return r.status_code, r.headers, response
+        if self.response_cache != None:
+            key = (self.base_url, uri, repr(sorted(params.items())) if isinstance(params, dict) else repr(params), self.token)
+            return self.response_cache.get(key, uri, lambda headers: self.__fetch__(uri, params, headers), base_url=self.base_url)
+        status, headers, response, _ = self.__fetch__(uri, params)
+        return status, headers, response
 
     def post(self, uri, params):
         headers = self.__headers__()
         headers['content-type'] = 'application/json'
-        r = requests.post('{}/{}'.format(self.base_url, uri), headers=headers, data=json.dumps(params))
-        response = r.text
-        if r.status_code < 300 and r.headers['content-type'].find('application/json') == 0:
-            response = r.json()
-        return r.status_code, r.headers, response
+        r = self.__request__('POST', uri, headers=headers, data=self.__body__('POST', uri, params, headers))
+        self.__invalidate__(uri)
+        return r.status_code, r.headers, self.__decode__(r, r.status_code < 300)
 
     def put(self, uri, params):
         headers = self.__headers__()
         headers['content-type'] = 'application/json'
-        r = requests.put('{}/{}'.format(self.base_url, uri), headers=headers, data=json.dumps(params))
-        response = r.text
-        if r.status_code < 300 and r.headers['content-type'].find('application/json') == 0:
-            response = r.json()
-        return r.status_code, r.headers, response
+        r = self.__request__('PUT', uri, headers=headers, data=self.__body__('PUT', uri, params, headers))
+        self.__invalidate__(uri)
+        return r.status_code, r.headers, self.__decode__(r, r.status_code < 300)
 
     def delete(self, uri):
-        r = requests.delete('{}/{}'.format(self.base_url, uri), headers=self.__headers__())
-        response = r.text
-        if r.status_code < 300 and r.headers['content-type'].find('application/json') == 0:
-            response = r.json()
-        return r.status_code, r.headers, response
+        r = self.__request__('DELETE', uri, headers=self.__headers__())
+        self.__invalidate__(uri)
+        return r.status_code, r.headers, self.__decode__(r, r.status_code < 300)
+
+    def fetch_many(self, fetch, ids, concurrency=DEFAULT_FETCH_CONCURRENCY):
+        '''Call fetch once per distinct id, at most concurrency calls at a time.
+
+        Concurrency is capped at the client's pool_size, since requests beyond
+        the connection pool would open connections which are then discarded.
+
+        Returns a list with the status, headers and response of each id in input
+        order; if a call raised, its status and headers are None and its response
+        is the exception.
+        '''
+        distinct = list(OrderedDict.fromkeys(ids))
+        if len(distinct) == 0:
+            return []
+
+        def fetch_one(id):
+            try:
+                return fetch(id)
+            except Exception as e:
+                return None, None, e
+
+        executor = ThreadPoolExecutor(max_workers=min(len(distinct), concurrency, self.pool_size))
+        try:
+            results = dict(zip(distinct, executor.map(fetch_one, distinct)))
+        finally:
+            executor.shutdown()
+        return [results[id] for id in ids]
+
+    def paginate(self, uri, params, rpp=DEFAULT_RPP, prefetch=True):
+        '''Yield each item of a paginated list endpoint, fetching the next page in the background while the current page is consumed.'''
+        params = dict(params or {})
+        page = int(params.pop('page', 1))
+        rpp = int(params.pop('rpp', rpp))
+
+        def fetch(page):
+            page_params = dict(params)
+            page_params.update(page=page, rpp=rpp)
+            return self.get(uri, page_params)
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            pending = executor.submit(fetch, page) if executor != None else None
+            fetched = 0
+            while True:
+                status, headers, items = pending.result() if pending != None else fetch(page)
+                if status != 200:
+                    raise Exception('failed to fetch page {} of {}; status: {}'.format(page, uri, status))
+                fetched += len(items)
+                more = self.__more__(headers, items, fetched, rpp)
+                if more and executor != None:
+                    pending = executor.submit(fetch, page + 1)
+                for item in items:
+                    yield item
+                if not more:
+                    break
+                page += 1
+        finally:
+            if executor != None:
+                executor.shutdown(wait=False)
+
+    def stream(self, uri, params, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+        '''Yield each element of the JSON array returned by the given endpoint as soon as its bytes arrive.'''
+        r = self.__request__('GET', uri, headers=self.__headers__(), params=params, stream=True)
+        try:
+            if r.status_code != 200:
+                raise Exception('failed to stream {}; status: {}'.format(uri, r.status_code))
+            chunks = r.iter_content(chunk_size)
+            encoding = r.headers.get('content-encoding', None)
+            if encoding != None and self.metrics.enabled:
+                chunks = self.__counted__(chunks, 'GET', uri, r)
+            for item in iter_json_array(chunks, self.codec.loads):
+                yield item
+        finally:
+            r.close()
+
+    def __acquire_session__(self, scheme, host, pool_size):
+        return acquire_session(scheme, host, pool_size)
+
+    def __body__(self, method, uri, params, headers):
+        '''Encode a request body, gzip-encoding it if it is at least compression_threshold bytes and compresses.'''
+        body = self.codec.dumps(params)
+        if self.compression_threshold == None or len(body) < self.compression_threshold:
+            return body
+        raw = body.encode('utf-8') if isinstance(body, str) else body
+        compressed = gzip_body(raw, self.compression_level)
+        if len(compressed) >= len(raw):
+            return body
+        headers['content-encoding'] = 'gzip'
+        if self.metrics.enabled:
+            self.metrics.record_compression(method, endpoint_template(uri), 'request', len(raw), len(compressed))
+        return compressed
+
+    def __counted__(self, chunks, method, uri, r):
+        '''Yield the given decoded chunks of a streamed response, then record its compression.'''
+        decoded = 0
+        for chunk in chunks:
+            decoded += len(chunk)
+            yield chunk
+        self.metrics.record_compression(method, endpoint_template(uri), 'response', decoded, r.raw.tell())
+
+    def __decode__(self, r, success):
+        if success and r.headers.get('content-type', '').find('application/json') == 0:
+            return self.codec.loads(r.content)
+        return r.text
+
+    def __fetch__(self, uri, params, headers=None):
+        request_headers = self.__headers__()
+        request_headers.update(headers or {})
+        r = self.__request__('GET', uri, headers=request_headers, params=params)
+        return r.status_code, r.headers, self.__decode__(r, r.status_code == 200), len(r.content)
+
+    def __invalidate__(self, uri):
+        if self.response_cache != None:
+            self.response_cache.invalidate(uri, base_url=self.base_url)
+
+    def __more__(self, headers, items, fetched, rpp):
+        # the server may cap rpp below the requested value, so a short page only ends iteration without a total count
+        if len(items) == 0:
+            return False
+        total = headers.get(APIClient.TOTAL_RESULTS_COUNT_HEADER, None)
+        if total != None:
+            return fetched < int(total)
+        return len(items) == rpp
+
+    def __request__(self, method, uri, **kwargs):
+        if self.session == None:
+            raise Exception('unable to make API request using closed client')
+        kwargs.setdefault('timeout', self.timeout)
+        url = '{}/{}'.format(self.base_url, uri)
+        r = self.__dispatch__(method, uri, url, **kwargs)
+        if r.status_code == 401 and self.tokens != None:
+            token = self.tokens.invalidate(self.__bearer__(kwargs.get('headers', None)))
+            if token != None:
+                r.close()
+                kwargs['headers']['authorization'] = 'bearer {}'.format(token)
+                r = self.__dispatch__(method, uri, url, **kwargs)
+        return r
+
+    def __dispatch__(self, method, uri, url, **kwargs):
+        if self.hedging == None or not self.hedging.idempotent(method) or kwargs.get('stream', False):
+            return self.__attempt__(method, uri, url, **kwargs)
+
+        connect_timeout, read_timeout = kwargs.pop('timeout')
+
+        def attempt(timeout):
+            return self.__attempt__(method, uri, url, timeout=(connect_timeout, timeout), **kwargs)
+
+        return self.hedging.call(self.host, method, endpoint_template(uri), attempt, read_timeout,
+                                 lambda r: r.status_code, self.metrics)
+
+    def __attempt__(self, method, uri, url, **kwargs):
+        if self.scheduler == None:
+            return self.__send__(method, uri, url, **kwargs)
+
+        endpoint = endpoint_template(uri)
+        self.scheduler.acquire(self.host, method, endpoint, self.priority, self.metrics)
+        r = self.__send__(method, uri, url, **kwargs)
+        self.scheduler.record(self.host, method, endpoint, r.status_code, r.headers)
+        return r
+
+    def __send__(self, method, uri, url, **kwargs):
+        if not self.metrics.enabled:
+            return self.session.request(method, url, **kwargs)
+
+        started = time.time()
+        stream = kwargs.pop('stream', False)
+        try:
+            r = self.session.request(method, url, stream=True, **kwargs)
+            reused = connection_reused(r)
+            response_bytes = len(r.content) if not stream else int(r.headers.get('content-length', 0))
+        except Exception:
+            self.metrics.record_request(method, endpoint_template(uri), None, time.time() - started, 0, 0, None)
+            raise
+        self.metrics.record_request(method, endpoint_template(uri), r.status_code, time.time() - started,
+                                    len(r.request.body or ''), response_bytes, reused)
+        if not stream and r.headers.get('content-encoding', None) != None:
+            self.metrics.record_compression(method, endpoint_template(uri), 'response', len(r.content), r.raw.tell())
+        return r
+
+    def __timeout__(self, connect_timeout, read_timeout):
+        return connect_timeout, read_timeout
+
+    def __bearer__(self, headers):
+        '''Return the bearer token of the given request headers, or None.'''
+        authorization = (headers or {}).get('authorization', '')
+        return authorization[len('bearer '):] if authorization.startswith('bearer ') else None
 
     def __headers__(self):
         headers = {
             'user-agent': os.environ.get('API_USER_AGENT', 'provide-python client'),
         }
-        if self.token != None:
-            headers['authorization'] = 'bearer {}'.format(self.token)
+        token = self.token
+        if token != None:
+            headers['authorization'] = 'bearer {}'.format(token)
         return headers
@@ -0,0 +1,261 @@
+'''Coroutine-based API client base class.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import aiohttp
+import asyncio
+import time
+
+from collections import OrderedDict
+from .api_client import APIClient
+from .codec import JSONArrayDecoder
+from .metrics import endpoint_template
+
+_sessions = {}
+
+
+def acquire_session(scheme, host, pool_size):
+    '''Acquire a reference to the shared aiohttp session entry for the given scheme and host.
+
+    The pool holds the largest pool_size requested by any client of the session.
+    '''
+    key = (scheme, host)
+    entry = _sessions.get(key, None)
+    if entry == None:
+        entry = _sessions[key] = {'session': None, 'refs': 0, 'pool_size': pool_size, 'retired': []}
+    if pool_size > entry['pool_size']:
+        entry['pool_size'] = pool_size
+        if entry['session'] != None:
+            # in-flight requests complete on the previous session, which is closed with the last reference
+            entry['retired'].append(entry['session'])
+            entry['session'] = None
+    entry['refs'] += 1
+    return entry
+
+
+def open_session(entry):
+    '''Return the aiohttp session for the given shared session entry, opening it on first use.'''
+    if entry['session'] == None:
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=entry['pool_size'])
+        entry['session'] = aiohttp.ClientSession(connector=connector)
+    return entry['session']
+
+
+async def release_session(scheme, host):
+    '''Release a reference to the shared aiohttp session; the last reference closes its pool.'''
+    key = (scheme, host)
+    entry = _sessions.get(key, None)
+    if entry == None:
+        return
+    entry['refs'] -= 1
+    if entry['refs'] <= 0:
+        del _sessions[key]
+        for session in entry['retired'] + [entry['session']]:
+            if session != None:
+                await session.close()
+
+
+class AsyncAPIClient(APIClient):
+    '''API client whose request methods are coroutines.
+
+    All clients for the same scheme and host share one aiohttp session and
+    connection pool, which is bound to the event loop on which the first
+    request is made.
+    '''
+
+    DEFAULT_POOL_SIZE = 100
+
+    def __init__(self, scheme, host, token, pool_size=DEFAULT_POOL_SIZE, **kwargs):
+        if kwargs.get('response_cache', None) != None:
+            raise Exception('unable to cache responses using async API client')
+        super(AsyncAPIClient, self).__init__(scheme, host, token, pool_size=pool_size, **kwargs)
+
+    async def close(self):
+        '''Release this client's reference to the shared HTTP connection pool.'''
+        if self.session != None:
+            self.session = None
+            await release_session(self.scheme, self.host)
+
+    async def get(self, uri, params):
+        await self.__authorize__()
+        r = await self.__request__('GET', uri, headers=self.__headers__(), params=self.__params__(params))
+        return r.status, r.headers, await self.__decode__(r, r.status == 200)
+
+    async def post(self, uri, params):
+        await self.__authorize__()
+        headers = self.__headers__()
+        headers['content-type'] = 'application/json'
+        r = await self.__request__('POST', uri, headers=headers, data=self.__body__('POST', uri, params, headers))
+        return r.status, r.headers, await self.__decode__(r, r.status < 300)
+
+    async def put(self, uri, params):
+        await self.__authorize__()
+        headers = self.__headers__()
+        headers['content-type'] = 'application/json'
+        r = await self.__request__('PUT', uri, headers=headers, data=self.__body__('PUT', uri, params, headers))
+        return r.status, r.headers, await self.__decode__(r, r.status < 300)
+
+    async def delete(self, uri):
+        await self.__authorize__()
+        r = await self.__request__('DELETE', uri, headers=self.__headers__())
+        return r.status, r.headers, await self.__decode__(r, r.status < 300)
+
+    async def fetch_many(self, fetch, ids, concurrency=APIClient.DEFAULT_FETCH_CONCURRENCY):
+        '''Await fetch once per distinct id, at most concurrency calls at a time.
+
+        Returns a list with the status, headers and response of each id in input
+        order; if a call raised, its status and headers are None and its response
+        is the exception.
+        '''
+        distinct = list(OrderedDict.fromkeys(ids))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch_one(id):
+            async with semaphore:
+                try:
+                    return await fetch(id)
+                except Exception as e:
+                    return None, None, e
+
+        results = dict(zip(distinct, await asyncio.gather(*[fetch_one(id) for id in distinct])))
+        return [results[id] for id in ids]
+
+    async def paginate(self, uri, params, rpp=APIClient.DEFAULT_RPP, prefetch=True):
+        '''Yield each item of a paginated list endpoint, fetching the next page concurrently while the current page is consumed.'''
+        params = dict(params or {})
+        page = int(params.pop('page', 1))
+        rpp = int(params.pop('rpp', rpp))
+
+        def fetch(page):
+            page_params = dict(params)
+            page_params.update(page=page, rpp=rpp)
+            return self.get(uri, page_params)
+
+        pending = asyncio.ensure_future(fetch(page)) if prefetch else None
+        try:
+            fetched = 0
+            while True:
+                status, headers, items = await (pending if pending != None else fetch(page))
+                if status != 200:
+                    raise Exception('failed to fetch page {} of {}; status: {}'.format(page, uri, status))
+                fetched += len(items)
+                more = self.__more__(headers, items, fetched, rpp)
+                pending = asyncio.ensure_future(fetch(page + 1)) if more and prefetch else None
+                for item in items:
+                    yield item
+                if not more:
+                    break
+                page += 1
+        finally:
+            if pending != None and not pending.done():
+                pending.cancel()
+
+    async def stream(self, uri, params, chunk_size=APIClient.DEFAULT_STREAM_CHUNK_SIZE):
+        '''Yield each element of the JSON array returned by the given endpoint as soon as its bytes arrive.'''
+        if self.session == None:
+            raise Exception('unable to make API request using closed client')
+        url = '{}/{}'.format(self.base_url, uri)
+        await self.__authorize__()
+        if self.scheduler != None:
+            await self.scheduler.acquire_async(self.host, 'GET', endpoint_template(uri), self.priority, self.metrics)
+        async with open_session(self.session).request('GET', url, headers=self.__headers__(),
+                                                      params=self.__params__(params), timeout=self.timeout) as r:
+            if self.scheduler != None:
+                self.scheduler.record(self.host, 'GET', endpoint_template(uri), r.status, r.headers)
+            if r.status != 200:
+                raise Exception('failed to stream {}; status: {}'.format(uri, r.status))
+            decoder = JSONArrayDecoder(self.codec.loads)
+            decoded = 0
+            async for chunk in r.content.iter_chunked(chunk_size):
+                decoded += len(chunk)
+                for item in decoder.feed(chunk):
+                    yield item
+            decoder.close()
+            if self.metrics.enabled and r.headers.get('content-encoding', None) != None:
+                self.metrics.record_compression('GET', endpoint_template(uri), 'response', decoded, self.__wire_bytes__(r))
+
+    def __acquire_session__(self, scheme, host, pool_size):
+        return acquire_session(scheme, host, pool_size)
+
+    async def __authorize__(self):
+        '''Wait off the event loop for the first token of a provider which has none yet.'''
+        if self.tokens != None and not self.tokens.available():
+            await asyncio.get_event_loop().run_in_executor(None, self.tokens.token)
+
+    async def __decode__(self, r, success):
+        response = await r.text()
+        if success and r.headers.get('content-type', '').find('application/json') == 0:
+            return self.codec.loads(response)
+        return response
+
+    async def __request__(self, method, uri, **kwargs):
+        if self.session == None:
+            raise Exception('unable to make API request using closed client')
+        kwargs.setdefault('timeout', self.timeout)
+        r = await self.__dispatch__(method, uri, **kwargs)
+        if r.status == 401 and self.tokens != None:
+            loop = asyncio.get_event_loop()
+            token = await loop.run_in_executor(None, self.tokens.invalidate, self.__bearer__(kwargs.get('headers', None)))
+            if token != None:
+                kwargs['headers']['authorization'] = 'bearer {}'.format(token)
+                r = await self.__dispatch__(method, uri, **kwargs)
+        return r
+
+    async def __dispatch__(self, method, uri, **kwargs):
+        if self.hedging == None or not self.hedging.idempotent(method):
+            return await self.__attempt__(method, uri, **kwargs)
+
+        timeout = kwargs.pop('timeout')
+
+        def attempt(read_timeout):
+            attempt_timeout = aiohttp.ClientTimeout(sock_connect=timeout.sock_connect, sock_read=read_timeout)
+            return self.__attempt__(method, uri, timeout=attempt_timeout, **kwargs)
+
+        return await self.hedging.call_async(self.host, method, endpoint_template(uri), attempt, timeout.sock_read,
+                                             lambda r: r.status, self.metrics)
+
+    async def __attempt__(self, method, uri, **kwargs):
+        if self.scheduler != None:
+            await self.scheduler.acquire_async(self.host, method, endpoint_template(uri), self.priority, self.metrics)
+        started = time.time() if self.metrics.enabled else None
+        try:
+            async with open_session(self.session).request(method, '{}/{}'.format(self.base_url, uri), **kwargs) as r:
+                content = await r.read()
+        except Exception:
+            if started != None:
+                self.metrics.record_request(method, endpoint_template(uri), None, time.time() - started, 0, 0, None)
+            raise
+        if started != None:
+            self.metrics.record_request(method, endpoint_template(uri), r.status, time.time() - started,
+                                        len(kwargs.get('data', None) or ''), len(content), None)
+            if r.headers.get('content-encoding', None) != None:
+                self.metrics.record_compression(method, endpoint_template(uri), 'response', len(content), self.__wire_bytes__(r))
+        if self.scheduler != None:
+            self.scheduler.record(self.host, method, endpoint_template(uri), r.status, r.headers)
+        return r
+
+    def __timeout__(self, connect_timeout, read_timeout):
+        return aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+
+    def __wire_bytes__(self, r):
+        '''Return the number of encoded body bytes received for the given response.'''
+        wire_bytes = getattr(r.content, 'total_raw_bytes', None)
+        return wire_bytes if wire_bytes != None else int(r.headers.get('content-length', 0))
+
+    def __params__(self, params):
+        if not params:
+            return None
+        return dict((k, v if isinstance(v, (str, int, float)) and not isinstance(v, bool) else str(v))
+                    for k, v in params.items() if v != None)
@@ -0,0 +1,332 @@
+'''Coroutine-based API client for the provide.services message bus microservice architecture.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import aiohttp
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from .async_api_client import acquire_session, open_session, release_session
+from .async_goldmine import AsyncGoldmine
+from .async_ident import AsyncIdent
+from .async_subscription import AsyncSubscription
+from .connector_pool import ROUTING_LEAST_OUTSTANDING, ConnectorPool, connector_nodes
+from .envelope import HEADER, decode_message, index_entry_range, parse_header, parse_index_entry
+from .message_bus import MessageBus, content_range, ipfs_connectors, message_bus_application, message_source, registry_contract
+from .subscription import Subscription
+
+
+class AsyncMessageBus(AsyncGoldmine):
+    '''Message bus client whose resolution, IPFS and publish methods are coroutines.
+
+    Construction performs no I/O; await connect() to resolve the application,
+    registry contract and connector and to open the IPFS session.
+    '''
+
+    def __init__(self, token, account_address, multipart_chunk_size=MessageBus.DEFAULT_MULTIPART_CHUNK_SIZE,
+                 resolution_cache=None, resolve_concurrency=MessageBus.DEFAULT_RESOLVE_CONCURRENCY, blob_cache=None,
+                 routing=ROUTING_LEAST_OUTSTANDING, **kwargs):
+        '''Initialize a message bus instance; additional keyword arguments configure the shared HTTP connection pools.'''
+        super(AsyncMessageBus, self).__init__(token, **kwargs)
+        self.ident = AsyncIdent(self.tokens, **kwargs)
+        self.application_id = None
+        if self.tokens == None or self.tokens.available():
+            self.decode_jwt(self.tokens)
+        self.account_address = account_address
+        self.multipart_chunk_size = multipart_chunk_size
+        self.resolution_cache = resolution_cache
+        self.blob_cache = blob_cache
+        self.resolve_concurrency = resolve_concurrency
+        self.application = None
+        self.contract = None
+        self.connector = None
+        self.connectors = []
+        self.routing = routing
+        self.ipfs_pool = None
+
+    decode_jwt = MessageBus.decode_jwt
+    invalidate_resolution = MessageBus.invalidate_resolution
+    __resolve_cached__ = MessageBus.__resolve_cached__
+
+    async def connect(self):
+        '''Resolve the message bus and initialize the IPFS client session.'''
+        await self.resolve()
+        await self.init_ipfs()
+
+    async def init_ipfs(self):
+        '''Initialize an IPFS client session with every address of every resolved connector.'''
+        await self.__release_ipfs_session__()
+
+        if self.connector == None:
+            raise Exception('unable to establish IPFS client connection without resolution of a distributed filesystem connector')
+
+        with self.metrics.stage('resolve_connector_multiaddr'):
+            nodes = await asyncio.get_event_loop().run_in_executor(None, connector_nodes, self.connectors or [self.connector])
+        if len(nodes) == 0:
+            raise Exception('unable to establish IPFS client connection without resolution of configured distributed filesystem connector')
+
+        for node in nodes:
+            node.client = acquire_session('http', node.netloc, self.pool_size)
+        self.ipfs_pool = ConnectorPool(nodes, routing=self.routing,
+                                       transport_errors=(aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+        with self.metrics.stage('ipfs_connect'):
+            errors = await asyncio.gather(*[self.__version__(node) for node in nodes], return_exceptions=True)
+        for node, e in zip(nodes, errors):
+            if e != None:
+                logging.warning('failed to establish IPFS client connection to {}; {}'.format(node.multiaddr, e))
+                self.ipfs_pool.eject(node, e)
+        if all(e != None for e in errors):
+            await self.__release_ipfs_session__()
+            raise Exception('unable to establish IPFS client connection to any configured distributed filesystem connector')
+
+    async def close(self):
+        '''Free resources and exit.'''
+        await self.__release_ipfs_session__()
+        await self.ident.close()
+        await super(AsyncMessageBus, self).close()
+
+    async def ipfs_add(self, msg, **kwargs):
+        '''Add the given file to IPFS, streaming it in multipart_chunk_size chunks; see message_source() for accepted types.'''
+        if self.ipfs_pool == None:
+            raise Exception('unable to add file to IPFS without resolution of configured connector')
+
+        name, chunks, _ = message_source(msg, self.multipart_chunk_size)
+        filename = kwargs.pop('filename', name or '{}.bytes'.format(uuid.uuid4()))
+        wrap_with_directory = kwargs.pop('wrap_with_directory', False)
+        params = {
+            'wrap-with-directory': 'true' if wrap_with_directory else 'false',
+        }
+        params.update((k, str(v)) for k, v in kwargs.items())
+
+        writer = self.blob_cache.writer() if self.blob_cache != None and not wrap_with_directory else None
+        if writer != None:
+            chunks = writer.tee(chunks)
+
+        form = aiohttp.FormData()
+        form.add_field('file', self.__stream_chunks__(chunks), filename=filename, content_type='application/octet-stream')
+
+        async def add(node):
+            url = 'http://{}/api/v0/add'.format(node.netloc)
+            async with open_session(node.client).post(url, data=form, params=params, timeout=self.timeout) as r:
+                body = await r.text()
+                if r.status >= 300:
+                    raise Exception('failed to add file to IPFS; status: {}; response: {}'.format(r.status, body))
+            return body
+
+        try:
+            body = await self.__route__(add)
+        except Exception:
+            if writer != None:
+                writer.abort()
+            raise
+        resp = [json.loads(line) for line in body.splitlines() if line.strip()]
+        if writer != None:
+            writer.commit(resp[len(resp) - 1]['Hash'])
+        return resp
+
+    async def ipfs_cat(self, msghash, offset=None, length=None, **kwargs):
+        '''Return the content of the given IPFS hash, or the given range of it; content served from the blob cache is a memory-mapped memoryview.'''
+        if self.blob_cache != None:
+            content = self.blob_cache.get(msghash)
+            if content != None:
+                return content_range(content, offset, length)
+
+        if self.ipfs_pool == None:
+            raise Exception('unable to fetch file from IPFS without resolution of configured connector')
+
+        params = {'arg': msghash}
+        if offset != None:
+            params['offset'] = str(offset)
+        if length != None:
+            params['length'] = str(length)
+        params.update((k, str(v)) for k, v in kwargs.items())
+
+        async def cat(node):
+            url = 'http://{}/api/v0/cat'.format(node.netloc)
+            async with open_session(node.client).post(url, params=params, timeout=self.timeout) as r:
+                body = await r.read()
+                if r.status >= 300:
+                    raise Exception('failed to fetch file from IPFS; status: {}; response: {}'.format(r.status, body))
+            return body
+
+        body = await self.__route__(cat)
+        if self.blob_cache != None and offset == None and length == None:
+            await asyncio.get_event_loop().run_in_executor(None, self.blob_cache.set, msghash, body)
+        return body
+
+    async def add_message(self, msg, **kwargs):
+        '''Add the given message to IPFS; returns its hash.'''
+        try:
+            with self.metrics.stage('ipfs_add'):
+                resp = await self.ipfs_add(msg, **kwargs)
+        except Exception:
+            self.invalidate_resolution()
+            raise
+        msghash = resp[len(resp) - 1]['Hash']
+        logging.info('published {}-byte raw message to IPFS; hash: {}'.format(resp[len(resp) - 1].get('Size', None), msghash))
+        return msghash
+
+    async def register_message(self, subject, msghash):
+        '''Register the given IPFS hash on a subject with the on-chain registry contract; returns the execution status.'''
+        with self.metrics.stage('execute_contract'):
+            status, _, _ = await self.execute_contract(self.contract.get('id'), {
+                'method': MessageBus.CONTRACT_METHOD_PUBLISH,
+                'params': [subject, msghash],
+                'value': 0,
+                'account_address': self.account_address,
+            })
+        if status == 202:
+            logging.info('published message on subject: {}'.format(subject))
+        else:
+            logging.warning('failed to publish message on subject: {}'.format(subject))
+            self.invalidate_resolution()
+        return status
+
+    async def publish_message(self, subject, msg, **kwargs):
+        '''Publish a message; returns its IPFS hash and the contract execution status.'''
+        if self.contract == None:
+            raise Exception('unable to publish message without resolution of an on-chain registry contract')
+
+        if self.ipfs_pool == None:
+            raise Exception('unable to publish message without resolution of configured connector')
+
+        with self.metrics.stage('publish_message'):
+            msghash = await self.add_message(msg, **kwargs)
+            return msghash, await self.register_message(subject, msghash)
+
+    async def fetch_message(self, msghash, **kwargs):
+        '''Fetch the content of the message with the given IPFS hash.'''
+        with self.metrics.stage('ipfs_cat'):
+            return await self.ipfs_cat(msghash, **kwargs)
+
+    async def fetch_batched_message(self, msghash, index):
+        '''Fetch the message at the given index of the envelope with the given IPFS hash, reading only the envelope header, its index entry and the message.'''
+        with self.metrics.stage('ipfs_cat'):
+            count, compression = parse_header(await self.ipfs_cat(msghash, offset=0, length=HEADER.size))
+            if index < 0 or index >= count:
+                raise IndexError('envelope message index out of range: {}'.format(index))
+            offset, length = index_entry_range(index)
+            offset, length = parse_index_entry(await self.ipfs_cat(msghash, offset=offset, length=length))
+            return decode_message(await self.ipfs_cat(msghash, offset=offset, length=length), compression)
+
+    def subscribe(self, subject, prefetch=Subscription.DEFAULT_PREFETCH, concurrency=Subscription.DEFAULT_CONCURRENCY, **kwargs):
+        '''Subscribe to the messages published on a subject; async iteration of the returned subscription yields (IPFS hash, message) tuples in order.'''
+        return AsyncSubscription(self, subject, prefetch=prefetch, concurrency=concurrency, **kwargs)
+
+    async def resolve(self):
+        '''Resolve the application, on-chain registry contract and distributed filesystem connector.'''
+        if self.application_id == None:
+            await self.__authorize__()
+            self.decode_jwt(self.tokens)
+        if self.__resolve_cached__():
+            return
+
+        with self.metrics.stage('resolve'):
+            await asyncio.gather(self.resolve_application(),
+                                 self.resolve_registry_contract(),
+                                 self.resolve_connector())
+
+        if self.resolution_cache != None and self.application != None and self.contract != None and self.connector != None:
+            self.resolution_cache.set(self.application_id, self.application, self.contract, self.connector, self.connectors)
+
+    async def resolve_application(self):
+        '''Resolve the message bus application.'''
+        logging.info('resolving message bus application')
+        self.application = None
+        status, _, resp = await self.ident.fetch_application_details(self.application_id)
+        self.application = message_bus_application(self.application_id, status, resp)
+
+    async def resolve_registry_contract(self):
+        '''Resolve the on-chain registry contract for the message bus.'''
+        logging.info('resolving on-chain registry contract for message bus')
+        self.contract = None
+        status, _, resp = await self.fetch_contracts({
+            'application_id': self.application_id,
+        })
+        contracts = await self.__fetch_details__(self.fetch_contract_details, resp) if status == 200 else None
+        self.contract = registry_contract(self.application_id, contracts)
+
+    async def resolve_connector(self):
+        '''Resolve the distributed filesystem connectors for the message bus.'''
+        logging.info('resolving distributed filesystem connector for message bus')
+        self.connector = None
+        self.connectors = []
+        status, _, resp = await self.fetch_connectors({
+            'application_id': self.application_id,
+        })
+        connectors = await self.__fetch_details__(self.fetch_connector_details, resp) if status == 200 else None
+        self.connectors = ipfs_connectors(self.application_id, connectors)
+        self.connector = self.connectors[0] if len(self.connectors) > 0 else None
+
+    async def __fetch_details__(self, fetch, items):
+        semaphore = asyncio.Semaphore(self.resolve_concurrency)
+
+        async def fetch_one(item):
+            async with semaphore:
+                _, _, details = await fetch(item.get('id', None))
+                return details
+
+        return await asyncio.gather(*[fetch_one(item) for item in items])
+
+    async def __stream_chunks__(self, chunks):
+        loop = asyncio.get_event_loop()
+        chunks = iter(chunks)
+        while True:
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk == None:
+                break
+            view = memoryview(chunk)
+            for offset in range(0, len(view), self.multipart_chunk_size):
+                yield view[offset:offset + self.multipart_chunk_size]
+
+    async def __probe__(self, node):
+        try:
+            await self.__version__(node)
+        except Exception as e:
+            self.ipfs_pool.probed(node, e)
+            return
+        self.ipfs_pool.probed(node)
+
+    async def __release_ipfs_session__(self):
+        if self.ipfs_pool != None:
+            pool = self.ipfs_pool
+            self.ipfs_pool = None
+            for node in pool.nodes:
+                await release_session('http', node.netloc)
+
+    async def __version__(self, node):
+        url = 'http://{}/api/v0/version'.format(node.netloc)
+        async with open_session(node.client).post(url, timeout=self.timeout) as r:
+            await r.read()
+            if r.status >= 300:
+                raise Exception('failed to fetch IPFS version; status: {}'.format(r.status))
+
+    async def __route__(self, fn):
+        pool = self.ipfs_pool
+        for node in pool.due_for_probe():
+            asyncio.ensure_future(self.__probe__(node))
+        node = pool.select()
+        started = time.time()
+        try:
+            result = await fn(node)
+        except Exception as e:
+            pool.complete(node, started, e)
+            raise
+        pool.complete(node, started)
+        return result
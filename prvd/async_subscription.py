@@ -0,0 +1,82 @@
+'''Coroutine-based subscriptions to the messages published on a message bus subject.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import logging
+import time
+
+from collections import deque
+from .subscription import Subscription
+
+
+class AsyncSubscription(Subscription):
+    '''Subscription whose polls are coroutines; iterate it with async for.'''
+
+    def __init__(self, message_bus, subject, **kwargs):
+        super(AsyncSubscription, self).__init__(message_bus, subject, **kwargs)
+        self.stopped = asyncio.Event()
+
+    def __aiter__(self):
+        return self.messages()
+
+    async def messages(self):
+        '''Yield an (IPFS hash, message) tuple for each new message on the subject until stopped.'''
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch_one(msghash):
+            async with semaphore:
+                return await self.message_bus.fetch_message(msghash)
+
+        window = deque()
+        try:
+            while not self.stopped.is_set():
+                hashes = deque(self.__published__(await self.poll()))
+                while hashes or window:
+                    while hashes and len(window) < self.prefetch:
+                        msghash, batched = hashes.popleft()
+                        window.append((msghash, batched, asyncio.ensure_future(fetch_one(msghash))))
+                    msghash, batched, msg = window.popleft()
+                    for msg in self.__unpack__(await msg, batched):
+                        yield msghash, msg
+                self.commit()
+                try:
+                    await asyncio.wait_for(self.stopped.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for _, _, msg in window:
+                msg.cancel()
+
+    async def poll(self):
+        '''Fetch the transactions added since the last committed poll, returning (kind, item) tuples oldest first.'''
+        polled_at = time.time()
+        new = {}
+        for kind in self.kinds:
+            new[kind] = await self.__fetch_new__(kind)
+        return self.__batch__(new, polled_at)
+
+    async def __fetch_new__(self, kind):
+        seen = set(self.cursors[kind])
+        items = []
+        keys = set()
+        for page in range(1, self.max_pages + 1):
+            status, _, response = await self.__fetch_page__(kind, self.__page_params__(page))
+            if status != 200:
+                raise Exception('failed to fetch {} for network {}; status: {}'.format(kind, self.network_id, status))
+            if self.__collect__(response, seen, keys, items):
+                return items
+        logging.warning('stopped following {} for network {} after {} pages'.format(kind, self.network_id, self.max_pages))
+        return items
@@ -0,0 +1,161 @@
+'''Batched publishing of many messages per IPFS object and contract execution.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import threading
+import time
+
+from concurrent.futures import Future
+from .envelope import COMPRESSION_NONE, batch_subject, pack
+
+
+class Batch(object):
+    '''Messages on one subject awaiting publication in a single envelope.'''
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.messages = []
+        self.futures = []
+        self.size = 0
+
+    def append(self, msg, future):
+        self.messages.append(msg)
+        self.futures.append(future)
+        self.size += len(msg)
+
+
+class BatchPublisher(object):
+    '''Publishes messages in batches, one envelope per subject and window.
+
+    Messages published on the same subject are packed into one envelope,
+    which is added to IPFS and registered with the on-chain registry contract
+    in a single call each, on the batch subject marking it as an envelope.
+    A batch is sealed once it holds max_messages messages or max_size bytes,
+    or max_delay seconds after its first message was published. Sealed
+    envelopes are published on the message bus's publish pipeline.
+    '''
+
+    DEFAULT_MAX_DELAY = 0.05
+    DEFAULT_MAX_MESSAGES = 256
+    DEFAULT_MAX_SIZE = 1024 * 1024
+
+    def __init__(self, message_bus, max_messages=DEFAULT_MAX_MESSAGES, max_size=DEFAULT_MAX_SIZE,
+                 max_delay=DEFAULT_MAX_DELAY, compression=COMPRESSION_NONE):
+        self.message_bus = message_bus
+        self.max_messages = max_messages
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.compression = compression
+        self.batches = {}
+        self.outstanding = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self.__run__, name='prvd-batch-publisher')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def publish(self, subject, msg):
+        '''Add a bytes-like message to the batch for its subject; returns a future resolving to the envelope's IPFS hash, the message's index within it and the contract execution status.'''
+        future = Future()
+        msg = bytes(msg)
+        with self.cond:
+            if self.closed:
+                raise Exception('unable to publish message using closed batch publisher')
+            batch = self.batches.get(subject, None)
+            if batch == None:
+                batch = self.batches[subject] = Batch(time.time() + self.max_delay)
+                self.cond.notify_all()
+            batch.append(msg, future)
+            self.outstanding += 1
+            sealed = None
+            if len(batch.messages) >= self.max_messages or batch.size >= self.max_size:
+                sealed = self.batches.pop(subject)
+        if sealed != None:
+            self.__publish__(subject, sealed)
+        return future
+
+    def flush(self, timeout=None):
+        '''Seal all open batches and wait for every published message to be registered; returns False if the timeout elapsed first.'''
+        with self.cond:
+            for batch in self.batches.values():
+                batch.deadline = 0
+            self.cond.notify_all()
+            if self.outstanding > 0:
+                self.cond.wait_for(lambda: self.outstanding == 0, timeout)
+            return self.outstanding == 0
+
+    drain = flush
+
+    def close(self):
+        '''Publish all open batches and stop sealing new ones.'''
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify_all()
+        self.flush()
+        self.thread.join()
+
+    def __run__(self):
+        while True:
+            with self.cond:
+                while True:
+                    now = time.time()
+                    expired = [subject for subject, batch in self.batches.items() if batch.deadline <= now]
+                    if expired or (self.closed and len(self.batches) == 0):
+                        break
+                    deadlines = [batch.deadline for batch in self.batches.values()]
+                    self.cond.wait(min(deadlines) - now if deadlines else None)
+                sealed = [(subject, self.batches.pop(subject)) for subject in expired]
+                if len(sealed) == 0:
+                    return
+            for subject, batch in sealed:
+                self.__publish__(subject, batch)
+
+    def __publish__(self, subject, batch):
+        messages = []
+        futures = []
+        for msg, future in zip(batch.messages, batch.futures):
+            if future.set_running_or_notify_cancel():
+                messages.append(msg)
+                futures.append(future)
+        if len(futures) < len(batch.futures):
+            self.__done__(len(batch.futures) - len(futures))
+        if len(futures) == 0:
+            return
+        try:
+            published = self.message_bus.submit_message(batch_subject(subject), pack(messages, self.compression))
+        except Exception as e:
+            logging.warning('failed to publish batch of {} messages on subject: {}; {}'.format(len(futures), subject, e))
+            self.__resolve__(futures, None, e)
+            return
+        published.add_done_callback(lambda published: self.__resolve__(futures, published, published.exception()))
+
+    def __resolve__(self, futures, published, e):
+        if e != None:
+            for future in futures:
+                future.set_exception(e)
+        else:
+            msghash, status = published.result()
+            for index, future in enumerate(futures):
+                future.set_result((msghash, index, status))
+        self.__done__(len(futures))
+
+    def __done__(self, count):
+        with self.cond:
+            self.outstanding -= count
+            if self.outstanding == 0:
+                self.cond.notify_all()
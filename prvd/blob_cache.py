@@ -0,0 +1,179 @@
+'''Content-addressed on-disk cache of IPFS content.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import mmap
+import os
+import re
+import threading
+
+from .cache_files import cache_dir, discard, open_temp, replace
+
+IPFS_HASH = re.compile(r'^[A-Za-z0-9]+$')
+
+
+class BlobCache(object):
+    '''Caches immutable IPFS content on disk, keyed by IPFS hash.
+
+    Each blob is stored as a file named by its hash. Writes go to a temporary
+    file which is renamed into place, so several processes may share one
+    cache directory. Hits are served from a read-only memory map and touch
+    the file's modification time, which orders least recently used blobs
+    for eviction once the cache exceeds its size budget.
+    '''
+
+    DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+    def __init__(self, path=None, max_size=DEFAULT_MAX_SIZE):
+        self.path = os.path.join(cache_dir(path), 'blobs')
+        self.max_size = max_size
+        self.size = None
+        self.lock = threading.Lock()
+
+    def get(self, msghash):
+        '''Return a read-only memoryview of the cached content of the given IPFS hash, or None if it is not cached.'''
+        filename = self.__filename__(msghash)
+        try:
+            with open(filename, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    content = memoryview(b'')
+                else:
+                    content = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            os.utime(filename, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return content
+
+    def set(self, msghash, content):
+        '''Cache the given bytes-like content of the given IPFS hash.'''
+        writer = self.writer()
+        writer.write(content)
+        writer.commit(msghash)
+
+    def writer(self):
+        '''Return a BlobWriter which caches content as it is written.'''
+        return BlobWriter(self)
+
+    def invalidate(self, msghash):
+        '''Remove the cached content of the given IPFS hash.'''
+        try:
+            size = os.path.getsize(self.__filename__(msghash))
+            os.remove(self.__filename__(msghash))
+        except OSError:
+            return
+        with self.lock:
+            if self.size != None:
+                self.size -= size
+
+    def clear(self):
+        '''Remove all cached content.'''
+        for entry in self.__entries__():
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+        with self.lock:
+            self.size = 0
+
+    def __added__(self, size):
+        with self.lock:
+            if self.size == None:
+                self.size = sum(entry.stat().st_size for entry in self.__entries__())
+            else:
+                self.size += size
+            if self.size > self.max_size:
+                self.__evict__()
+
+    def __entries__(self):
+        try:
+            return [entry for entry in os.scandir(self.path) if entry.is_file() and not entry.name.endswith('.tmp')]
+        except OSError:
+            return []
+
+    def __evict__(self):
+        entries = []
+        for entry in self.__entries__():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                self.size -= size
+            except OSError as e:
+                logging.warning('failed to evict cached IPFS content {}; {}'.format(path, e))
+
+    def __filename__(self, msghash):
+        if not IPFS_HASH.match(msghash or ''):
+            raise Exception('unable to cache IPFS content with invalid hash: {}'.format(msghash))
+        return os.path.join(self.path, msghash)
+
+
+class BlobWriter(object):
+    '''Writes content to a temporary file which is committed to the cache once its IPFS hash is known.'''
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.file = None
+        self.size = 0
+        try:
+            self.file, self.tmp = open_temp(cache.path, 'wb')
+        except (IOError, OSError) as e:
+            logging.warning('failed to open IPFS content cache for writing; {}'.format(e))
+
+    def tee(self, chunks):
+        '''Yield each of the given chunks after writing it to the cache.'''
+        for chunk in chunks:
+            self.write(chunk)
+            yield chunk
+
+    def write(self, chunk):
+        if self.file == None:
+            return
+        try:
+            self.file.write(chunk)
+            self.size += len(memoryview(chunk).cast('B'))
+        except (IOError, OSError) as e:
+            logging.warning('failed to write IPFS content to cache; {}'.format(e))
+            self.abort()
+
+    def commit(self, msghash):
+        '''Move the written content into the cache under the given IPFS hash.'''
+        if self.file == None:
+            return
+        try:
+            self.file.close()
+            self.file = None
+            replace(self.tmp, self.cache.__filename__(msghash))
+        except Exception as e:
+            logging.warning('failed to cache IPFS content for hash: {}; {}'.format(msghash, e))
+            self.abort()
+            return
+        self.cache.__added__(self.size)
+
+    def abort(self):
+        '''Discard the written content.'''
+        if self.file != None:
+            self.file.close()
+            self.file = None
+        if hasattr(self, 'tmp'):
+            discard(self.tmp)
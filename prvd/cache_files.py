@@ -0,0 +1,63 @@
+'''Shared on-disk cache directory with atomic file replacement.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import json
+import os
+import tempfile
+
+
+def cache_dir(path=None):
+    '''Return the given cache directory or, if None, $PRVD_CACHE_DIR, defaulting to ~/.prvd/cache.'''
+    if path != None:
+        return path
+    return os.environ.get('PRVD_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.prvd', 'cache'))
+
+
+def open_temp(directory, mode='w'):
+    '''Open a new temporary file in the given directory, creating it if needed; returns the open file and its path.'''
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    return os.fdopen(fd, mode), tmp
+
+
+def replace(tmp, filename):
+    '''Atomically move the given temporary file to filename, replacing any existing file; the temporary file is removed if the move fails.'''
+    try:
+        os.replace(tmp, filename)
+    except OSError:
+        discard(tmp)
+        raise
+
+
+def discard(tmp):
+    '''Remove the given temporary file, if it still exists.'''
+    try:
+        os.remove(tmp)
+    except OSError:
+        pass
+
+
+def write_json(filename, obj):
+    '''Atomically write obj to filename as a JSON document, so readers never observe a partial write.'''
+    f, tmp = open_temp(os.path.dirname(filename))
+    try:
+        with f:
+            json.dump(obj, f)
+    except Exception:
+        discard(tmp)
+        raise
+    replace(tmp, filename)
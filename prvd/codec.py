@@ -0,0 +1,149 @@
+'''Pluggable JSON codecs and incremental decoding of JSON arrays.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import json
+import re
+
+LONG_INTEGER = re.compile(br'\d{19,}')
+STRING_SPECIAL = re.compile(br'["\\]')
+STRUCTURAL = re.compile(br'["\[\]{},]')
+
+
+class JSONCodec(object):
+    '''JSON codec backed by the standard library.'''
+
+    def dumps(self, obj):
+        '''Encode the given object as a JSON document.'''
+        return json.dumps(obj)
+
+    def loads(self, data):
+        '''Decode the given JSON document from bytes or text.'''
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    '''JSON codec backed by orjson, falling back to the standard library.
+
+    orjson neither encodes integers wider than 64 bits nor decodes them without
+    loss of precision, so such documents, which are common for token amounts,
+    are handled by the standard library instead.
+    '''
+
+    def __init__(self):
+        import orjson
+        self.orjson = orjson
+
+    def dumps(self, obj):
+        try:
+            return self.orjson.dumps(obj)
+        except TypeError:
+            return json.dumps(obj)
+
+    def loads(self, data):
+        if LONG_INTEGER.search(data if isinstance(data, bytes) else data.encode('utf-8')):
+            return json.loads(data)
+        return self.orjson.loads(data)
+
+
+DEFAULT_CODEC = JSONCodec()
+
+
+class JSONArrayDecoder(object):
+    '''Incremental decoder for the elements of a JSON array.
+
+    Bytes are fed as they arrive and each element is decoded as soon as its
+    closing bytes have been fed; only the bytes of the element currently
+    being received are buffered.
+    '''
+
+    def __init__(self, loads=DEFAULT_CODEC.loads):
+        self.loads = loads
+        self.buf = bytearray()
+        self.pos = 0
+        self.start = None
+        self.depth = 0
+        self.in_string = False
+        self.done = False
+
+    def feed(self, chunk):
+        '''Feed the next chunk of bytes; returns the elements completed by it.'''
+        elements = []
+        if self.done:
+            return elements
+        buf = self.buf
+        buf += chunk
+        pos = self.pos
+        while True:
+            if self.in_string:
+                m = STRING_SPECIAL.search(buf, pos)
+                if m == None:
+                    pos = len(buf)
+                    break
+                if m.group() == b'\\':
+                    if m.end() >= len(buf):
+                        pos = m.start()
+                        break
+                    pos = m.end() + 1
+                    continue
+                self.in_string = False
+                pos = m.end()
+                continue
+
+            m = STRUCTURAL.search(buf, pos)
+            if m == None:
+                pos = len(buf)
+                break
+            c = m.group()
+            pos = m.end()
+            if self.start == None:
+                if c != b'[':
+                    raise ValueError('expected a JSON array')
+                self.start = pos
+                self.depth = 1
+            elif c == b'"':
+                self.in_string = True
+            elif c == b'[' or c == b'{':
+                self.depth += 1
+            elif c == b']' or c == b'}':
+                self.depth -= 1
+                if self.depth == 0:
+                    element = bytes(buf[self.start:m.start()])
+                    if element.strip():
+                        elements.append(self.loads(element))
+                    self.done = True
+                    del buf[:]
+                    break
+            elif self.depth == 1:
+                elements.append(self.loads(bytes(buf[self.start:m.start()])))
+                del buf[:pos]
+                pos = 0
+                self.start = 0
+        self.pos = pos
+        return elements
+
+    def close(self):
+        '''Raise ValueError unless the complete array has been fed.'''
+        if not self.done:
+            raise ValueError('truncated JSON array')
+
+
+def iter_json_array(chunks, loads=DEFAULT_CODEC.loads):
+    '''Decode the elements of a JSON array incrementally from an iterable of byte chunks.'''
+    decoder = JSONArrayDecoder(loads)
+    for chunk in chunks:
+        for element in decoder.feed(chunk):
+            yield element
+    decoder.close()
@@ -0,0 +1,224 @@
+'''Load-balanced, health-aware routing across IPFS connectors.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import random
+import socket
+import threading
+import time
+
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+ROUTING_LATENCY = 'latency'
+ROUTING_LEAST_OUTSTANDING = 'least_outstanding'
+
+
+class DNSCache(object):
+    '''Caches the IPv4 and IPv6 addresses of hosts for a fixed TTL.'''
+
+    DEFAULT_TTL = 60
+
+    def __init__(self, ttl=DEFAULT_TTL):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, host, port):
+        '''Return the distinct (address family, address) pairs of the given host, resolving it if the cached entry is missing or expired.'''
+        key = (host, port)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key, None)
+        if entry != None and entry[0] > now:
+            return entry[1]
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        addresses = list(OrderedDict.fromkeys((family, sockaddr[0]) for family, _, _, _, sockaddr in infos))
+        with self.lock:
+            self.entries[key] = (now + self.ttl, addresses)
+        return addresses
+
+    def invalidate(self, host=None):
+        '''Remove the cached addresses of the given host, or of every host.'''
+        with self.lock:
+            for key in list(self.entries.keys()):
+                if host == None or key[0] == host:
+                    del self.entries[key]
+
+
+dns_cache = DNSCache()
+
+
+def connector_nodes(connectors, dns=None):
+    '''Return a ConnectorNode for each resolved address of the IPFS API host of each of the given connectors.'''
+    dns = dns if dns != None else dns_cache
+    nodes = []
+    for connector in connectors:
+        api_url = connector.get('config', {}).get('api_url', None)
+        if api_url == None:
+            logging.warning('unable to route to connector {} without api_url'.format(connector.get('id', None)))
+            continue
+        url = urlparse(api_url)
+        for family, address in dns.resolve(url.hostname, url.port):
+            nodes.append(ConnectorNode(connector, family, address, url.port))
+    return nodes
+
+
+class ConnectorNode(object):
+    '''One address of a distributed filesystem connector, with its routing and health state.'''
+
+    def __init__(self, connector, family, address, port):
+        self.connector = connector
+        self.family = family
+        self.address = address
+        self.port = port
+        self.client = None
+        self.outstanding = 0
+        self.latency = None
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = None
+        self.probing = False
+
+    @property
+    def multiaddr(self):
+        protocol = 'ip6' if self.family == socket.AF_INET6 else 'ip4'
+        return '/{}/{}/tcp/{}'.format(protocol, self.address, self.port)
+
+    @property
+    def netloc(self):
+        if self.family == socket.AF_INET6:
+            return '[{}]:{}'.format(self.address, self.port)
+        return '{}:{}'.format(self.address, self.port)
+
+
+class ConnectorPool(object):
+    '''Routes IPFS requests across the nodes of every resolved connector.
+
+    Each request is routed to the healthy node with the fewest outstanding
+    requests or, with latency routing, the lowest smoothed latency. A node
+    which fails failure_threshold consecutive requests with one of
+    transport_errors is ejected for ejection_time seconds, doubling with
+    each consecutive ejection up to max_ejection_time; once its ejection has
+    elapsed, the node is returned by due_for_probe() and restored when a
+    probe succeeds. If every node has been ejected, requests are routed
+    across those with a connected client. Other errors, such as IPFS error
+    responses for unknown content, come from a healthy node and leave its
+    health unchanged.
+    '''
+
+    DEFAULT_EJECTION_TIME = 5
+    DEFAULT_FAILURE_THRESHOLD = 3
+    DEFAULT_MAX_EJECTION_TIME = 300
+    SMOOTHING = 0.2
+
+    def __init__(self, nodes, routing=ROUTING_LEAST_OUTSTANDING,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 ejection_time=DEFAULT_EJECTION_TIME,
+                 max_ejection_time=DEFAULT_MAX_EJECTION_TIME,
+                 transport_errors=(Exception,)):
+        if routing not in (ROUTING_LATENCY, ROUTING_LEAST_OUTSTANDING):
+            raise Exception('unsupported connector routing: {}'.format(routing))
+        self.nodes = list(nodes)
+        self.routing = routing
+        self.failure_threshold = failure_threshold
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.transport_errors = tuple(transport_errors)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def call(self, fn):
+        '''Call fn with the selected node and record the outcome; returns its result.'''
+        node = self.select()
+        started = time.time()
+        try:
+            result = fn(node)
+        except Exception as e:
+            self.complete(node, started, e)
+            raise
+        self.complete(node, started)
+        return result
+
+    def select(self):
+        '''Select the node to which the next request is routed and count it as outstanding.'''
+        with self.lock:
+            # nodes whose initial connection failed have no client until a probe reconnects them
+            connected = [node for node in self.nodes if node.client != None]
+            if len(connected) == 0:
+                raise Exception('unable to route request; no IPFS connector available')
+            candidates = [node for node in connected if node.ejected_until == None] or connected
+            if self.routing == ROUTING_LATENCY:
+                key = lambda node: (node.latency or 0, node.outstanding)
+            else:
+                key = lambda node: (node.outstanding, node.latency or 0)
+            best = min(key(node) for node in candidates)
+            node = random.choice([node for node in candidates if key(node) == best])
+            node.outstanding += 1
+            return node
+
+    def complete(self, node, started, error=None):
+        '''Record the outcome of a request routed to the given node; errors other than transport_errors are not failures.'''
+        with self.lock:
+            node.outstanding -= 1
+            if error != None and not isinstance(error, self.transport_errors):
+                return
+            if error == None:
+                elapsed = time.time() - started
+                node.latency = elapsed if node.latency == None else node.latency + ConnectorPool.SMOOTHING * (elapsed - node.latency)
+                node.failures = 0
+                if node.ejected_until != None:
+                    self.__restore__(node)
+                return
+            node.failures += 1
+            if node.failures >= self.failure_threshold and node.ejected_until == None:
+                self.__eject__(node, error)
+
+    def eject(self, node, error=None):
+        '''Eject the given node until it has been probed successfully.'''
+        with self.lock:
+            self.__eject__(node, error)
+
+    def due_for_probe(self):
+        '''Return the ejected nodes whose ejection has elapsed, marking them as being probed.'''
+        now = time.time()
+        with self.lock:
+            nodes = [node for node in self.nodes if node.ejected_until != None and node.ejected_until <= now and not node.probing]
+            for node in nodes:
+                node.probing = True
+            return nodes
+
+    def probed(self, node, error=None):
+        '''Record the outcome of a probe of the given node.'''
+        with self.lock:
+            node.probing = False
+            if error == None:
+                self.__restore__(node)
+            else:
+                self.__eject__(node, error)
+
+    def __eject__(self, node, error):
+        node.ejections += 1
+        node.ejected_until = time.time() + min(self.ejection_time * 2 ** (node.ejections - 1), self.max_ejection_time)
+        logging.warning('ejected IPFS connector node {}; {}'.format(node.multiaddr, error))
+
+    def __restore__(self, node):
+        node.ejected_until = None
+        node.ejections = 0
+        node.failures = 0
+        logging.info('restored IPFS connector node {}'.format(node.multiaddr))
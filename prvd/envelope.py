@@ -0,0 +1,112 @@
+'''Compact envelopes packing many messages into one IPFS object.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import struct
+import zlib
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+
+HEADER = struct.Struct('>8sBxxxI')
+INDEX_ENTRY = struct.Struct('>QQ')
+MAGIC = b'PRVDENV1'
+
+# envelopes are registered on a marked subject so subscribers never unpack a plain message that happens to begin with MAGIC
+BATCH_SUBJECT_PREFIX = 'prvd-batch:'
+
+
+def batch_subject(subject):
+    '''Return the registry subject on which envelopes of messages published on the given subject are registered.'''
+    return '{}{}'.format(BATCH_SUBJECT_PREFIX, subject)
+
+
+def pack(messages, compression=COMPRESSION_NONE):
+    '''Pack the given bytes-like messages into an envelope; returns its bytes.
+
+    An envelope is a header holding the message count and compression, an
+    index of the absolute offset and length of each message, and the
+    messages themselves. Messages are compressed individually so that any
+    one of them can be extracted without decoding the others.
+    '''
+    if compression == COMPRESSION_ZLIB:
+        messages = [zlib.compress(msg) for msg in messages]
+    elif compression != COMPRESSION_NONE:
+        raise Exception('unsupported envelope compression: {}'.format(compression))
+    lengths = [len(memoryview(msg).cast('B')) for msg in messages]
+    offset = HEADER.size + INDEX_ENTRY.size * len(messages)
+    envelope = bytearray(HEADER.pack(MAGIC, compression, len(messages)))
+    for length in lengths:
+        envelope += INDEX_ENTRY.pack(offset, length)
+        offset += length
+    for msg in messages:
+        envelope += msg
+    return bytes(envelope)
+
+
+def is_envelope(buf):
+    '''Return True if the given bytes-like object begins with an envelope header.'''
+    return len(buf) >= HEADER.size and bytes(buf[:len(MAGIC)]) == MAGIC
+
+
+def parse_header(buf):
+    '''Return the message count and compression of the envelope header at the start of the given bytes-like object.'''
+    if not is_envelope(buf):
+        raise Exception('unable to read envelope without a valid header')
+    _, compression, count = HEADER.unpack_from(buf)
+    return count, compression
+
+
+def index_entry_range(index):
+    '''Return the offset and length of the index entry of the message at the given index.'''
+    return HEADER.size + INDEX_ENTRY.size * index, INDEX_ENTRY.size
+
+
+def parse_index_entry(buf):
+    '''Return the offset and length of a message from its index entry.'''
+    return INDEX_ENTRY.unpack_from(buf)
+
+
+def decode_message(buf, compression):
+    '''Decode a message as stored in an envelope with the given compression.'''
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(buf)
+    return buf
+
+
+class Envelope(object):
+    '''Random access to the messages of an envelope held in memory or memory-mapped.
+
+    Uncompressed messages are returned as memoryview slices of the envelope,
+    without copying.
+    '''
+
+    def __init__(self, buf):
+        self.buf = memoryview(buf).cast('B')
+        self.count, self.compression = parse_header(self.buf)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.message(index)
+
+    def message(self, index):
+        '''Return the message at the given index.'''
+        if index < 0 or index >= self.count:
+            raise IndexError('envelope message index out of range: {}'.format(index))
+        offset, length = parse_index_entry(self.buf[index_entry_range(index)[0]:])
+        return decode_message(self.buf[offset:offset + length], self.compression)
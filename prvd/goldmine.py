@@ -16,24 +16,30 @@
 
 import os
 
-from api_client import APIClient
+from .api_client import APIClient
 
 
 class Goldmine(APIClient):
 
     DEFAULT_HOST = 'goldmine.provide.services'
 
-    def __init__(self, token):
+    def __init__(self, token, **kwargs):
         scheme = os.environ.get('GOLDMINE_API_SCHEME', Goldmine.DEFAULT_SCHEME)
         host = os.environ.get('GOLDMINE_API_HOST', Goldmine.DEFAULT_HOST)
-        super(Goldmine, self).__init__(scheme, host, token) 
+        super(Goldmine, self).__init__(scheme, host, token, **kwargs)
 
     def fetch_accounts(self, params):
         return self.get('accounts', params)
 
+    def iter_accounts(self, params, **kwargs):
+        return self.paginate('accounts', params, **kwargs)
+
     def fetch_account_details(self, account_id):
         return self.get('accounts/{}'.format(account_id), {})
 
+    def fetch_many_accounts(self, ids, **kwargs):
+        return self.fetch_many(self.fetch_account_details, ids, **kwargs)
+
     def fetch_account_balance(self, account_id, token_id):
         return self.get('accounts/{}/balances/{}'.format(account_id, token_id), {})
 
@@ -43,18 +49,30 @@ class Goldmine(APIClient):
     def fetch_bridges(self, params):
         return self.get('bridges', (self, params or {}))
 
+    def iter_bridges(self, params, **kwargs):
+        return self.paginate('bridges', params, **kwargs)
+
     def fetch_bridge_details(self, bridge_id):
         return self.get('bridges/{}'.format(bridge_id), {})
 
+    def fetch_many_bridges(self, ids, **kwargs):
+        return self.fetch_many(self.fetch_bridge_details, ids, **kwargs)
+
     def create_bridge(self, params):
         return self.post('bridges', params)
 
     def fetch_connectors(self, params):
         return self.get('connectors', params)
 
+    def iter_connectors(self, params, **kwargs):
+        return self.paginate('connectors', params, **kwargs)
+
     def fetch_connector_details(self, connectorId):
         return self.get('connectors/{}'.format(connectorId), {})
 
+    def fetch_many_connectors(self, ids, **kwargs):
+        return self.fetch_many(self.fetch_connector_details, ids, **kwargs)
+
     def create_connector(self, params):
         return self.post('connectors', params)
 
@@ -64,9 +82,15 @@ class Goldmine(APIClient):
     def fetch_contracts(self, params):
         return self.get('contracts', params)
 
+    def iter_contracts(self, params, **kwargs):
+        return self.paginate('contracts', params, **kwargs)
+
     def fetch_contract_details(self, contract_id):
         return self.get('contracts/{}'.format(contract_id), {})
 
+    def fetch_many_contracts(self, ids, **kwargs):
+        return self.fetch_many(self.fetch_contract_details, ids, **kwargs)
+
     def create_contract(self, params):
         return self.post('contracts', params)
 
@@ -76,6 +100,9 @@ class Goldmine(APIClient):
     def fetch_networks(self, params):
         return self.get('networks', params)
 
+    def iter_networks(self, params, **kwargs):
+        return self.paginate('networks', params, **kwargs)
+
     def create_network(self, params):
         return self.post('networks', params)
 
@@ -85,69 +112,129 @@ class Goldmine(APIClient):
     def fetch_network_details(self, network_id):
         return self.get('networks/{}'.format(network_id), {})
 
+    def fetch_many_networks(self, ids, **kwargs):
+        return self.fetch_many(self.fetch_network_details, ids, **kwargs)
+
     def fetch_network_accounts(self, network_id, params):
         return self.get('networks/{}/accounts'.format(network_id), params)
 
+    def iter_network_accounts(self, network_id, params, **kwargs):
+        return self.paginate('networks/{}/accounts'.format(network_id), params, **kwargs)
+
     def fetch_network_blocks(self, network_id, params):
         return self.get('networks/{}/blocks'.format(network_id), params)
 
+    def iter_network_blocks(self, network_id, params, **kwargs):
+        return self.paginate('networks/{}/blocks'.format(network_id), params, **kwargs)
+
+    def stream_network_blocks(self, network_id, params, **kwargs):
+        return self.stream('networks/{}/blocks'.format(network_id), params, **kwargs)
+
     def fetch_network_bridges(self, network_id, params):
         return self.get('networks/{}/bridges'.format(network_id), params)
 
+    def iter_network_bridges(self, network_id, params, **kwargs):
+        return self.paginate('networks/{}/bridges'.format(network_id), params, **kwargs)
+
     def fetch_network_connectors(self, network_id, params):
         return self.get('networks/{}/connectors'.format(network_id), params)
 
+    def iter_network_connectors(self, network_id, params, **kwargs):
+        return self.paginate('networks/{}/connectors'.format(network_id), params, **kwargs)
+
     def fetch_network_contracts(self, network_id, params):
         return self.get('networks/{}/contracts'.format(network_id), params)
 
+    def iter_network_contracts(self, network_id, params, **kwargs):
+        return self.paginate('networks/{}/contracts'.format(network_id), params, **kwargs)
+
     def fetch_network_contract_details(self, network_id, contract_id):
         return self.get('networks/{}/contracts/{}'.format(network_id, contract_id), {})
 
+    def fetch_many_network_contracts(self, network_id, ids, **kwargs):
+        return self.fetch_many(lambda id: self.fetch_network_contract_details(network_id, id), ids, **kwargs)
+
     def fetch_network_oracles(self, network_id, params):
         return self.get('networks/{}/oracles'.format(network_id), params)
 
+    def iter_network_oracles(self, network_id, params, **kwargs):
+        return self.paginate('networks/{}/oracles'.format(network_id), params, **kwargs)
+
     def fetch_network_tokens(self, network_id, params):
         return self.get('networks/{}/tokens'.format(network_id), params)
 
+    def iter_network_tokens(self, network_id, params, **kwargs):
+        return self.paginate('networks/{}/tokens'.format(network_id), params, **kwargs)
+
     def fetch_network_transactions(self, network_id, params):
         return self.get('networks/{}/transactions'.format(network_id), params)
 
+    def iter_network_transactions(self, network_id, params, **kwargs):
+        return self.paginate('networks/{}/transactions'.format(network_id), params, **kwargs)
+
+    def stream_network_transactions(self, network_id, params, **kwargs):
+        return self.stream('networks/{}/transactions'.format(network_id), params, **kwargs)
+
     def fetch_network_transaction_details(self, network_id, transaction_id):
         return self.get('networks/{}/transactions/{}'.format(network_id, transaction_id), {})
 
+    def fetch_many_network_transactions(self, network_id, ids, **kwargs):
+        return self.fetch_many(lambda id: self.fetch_network_transaction_details(network_id, id), ids, **kwargs)
+
     def fetch_network_status(self, network_id):
         return self.get('networks/{}/status'.format(network_id), {})
 
     def fetch_network_nodes(self, network_id, params):
         return self.get('networks/{}/nodes'.format(network_id), params)
 
+    def iter_network_nodes(self, network_id, params, **kwargs):
+        return self.paginate('networks/{}/nodes'.format(network_id), params, **kwargs)
+
     def create_network_node(self, network_id, params):
         return self.post('networks/{}/nodes'.format(network_id), params)
 
     def fetch_network_node_details(self, network_id, node_id):
         return self.get('networks/{}/nodes/{}'.format(network_id, node_id), {})
 
+    def fetch_many_network_nodes(self, network_id, ids, **kwargs):
+        return self.fetch_many(lambda id: self.fetch_network_node_details(network_id, id), ids, **kwargs)
+
     def fetch_network_node_logs(self, network_id, node_id):
         return self.get('networks/{}/nodes/{}/logs'.format(network_id, node_id), {})
 
+    def stream_network_node_logs(self, network_id, node_id, **kwargs):
+        return self.stream('networks/{}/nodes/{}/logs'.format(network_id, node_id), {}, **kwargs)
+
     def delete_network_node(self, network_id, node_id):
         return self.delete('networks/{}/nodes/{}'.format(network_id, node_id))
 
     def fetch_oracles(self, params):
         return self.get('oracles', params)
 
+    def iter_oracles(self, params, **kwargs):
+        return self.paginate('oracles', params, **kwargs)
+
     def fetch_oracle_details(self, oracle_id):
         return self.get('oracles/{}'.format(oracle_id), {})
 
+    def fetch_many_oracles(self, ids, **kwargs):
+        return self.fetch_many(self.fetch_oracle_details, ids, **kwargs)
+
     def create_oracle(self, params):
         return self.post('oracles', params)
 
     def fetch_tokens(self, params):
         return self.get('tokens', params)
 
+    def iter_tokens(self, params, **kwargs):
+        return self.paginate('tokens', params, **kwargs)
+
     def fetch_token_details(self, token_id):
         return self.get('tokens/{}'.format(token_id), {})
 
+    def fetch_many_tokens(self, ids, **kwargs):
+        return self.fetch_many(self.fetch_token_details, ids, **kwargs)
+
     def create_token(self, params):
         return self.post('tokens', params)
 
@@ -157,14 +244,26 @@ class Goldmine(APIClient):
     def fetch_transactions(self, params):
         return self.get('transactions', params)
 
+    def iter_transactions(self, params, **kwargs):
+        return self.paginate('transactions', params, **kwargs)
+
     def fetch_transaction_details(self, tx_id):
         return self.get('transactions/{}'.format(tx_id), {})
 
+    def fetch_many_transactions(self, ids, **kwargs):
+        return self.fetch_many(self.fetch_transaction_details, ids, **kwargs)
+
     def fetch_wallets(self, params):
         return self.get('wallets', params)
 
+    def iter_wallets(self, params, **kwargs):
+        return self.paginate('wallets', params, **kwargs)
+
     def fetch_wallet_details(self, wallet_id):
         return self.get('wallets/{}'.format(wallet_id), {})
 
+    def fetch_many_wallets(self, ids, **kwargs):
+        return self.fetch_many(self.fetch_wallet_details, ids, **kwargs)
+
     def create_wallet(self, params):
         return self.post('wallets', params)
@@ -0,0 +1,303 @@
+'''Hedged requests, adaptive timeouts and retries for idempotent API calls.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import bisect
+import contextvars
+import random
+import threading
+import time
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import NULL_METRICS
+from .scheduler import retry_after
+
+HEDGE_METHODS = ('GET', 'HEAD')
+NOT_SENT = object()
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class LatencyWindow(object):
+    '''Rolling window of the most recent latency samples of an endpoint.'''
+
+    def __init__(self, size):
+        self.samples = deque()
+        self.ordered = []
+        self.size = size
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add(self, latency):
+        if len(self.samples) == self.size:
+            del self.ordered[bisect.bisect_left(self.ordered, self.samples.popleft())]
+        self.samples.append(latency)
+        bisect.insort(self.ordered, latency)
+
+    def percentile(self, q):
+        return self.ordered[min(len(self.ordered) - 1, int(q * len(self.ordered)))]
+
+
+class HedgePolicy(object):
+    '''Hedges, times out and retries idempotent requests using the observed latency of each endpoint.
+
+    Latencies are kept per host, method and templated endpoint in a rolling
+    window of window_size samples. Once an endpoint has min_samples, a GET
+    still outstanding after its hedge_percentile latency is sent again;
+    hedges are limited to max_hedge_ratio of requests. An async request
+    returns whichever response arrives first. A sync request is sent on the
+    caller's thread, which cannot be abandoned, so it returns its own
+    response unless it raised, in which case the hedge's response is used. The read timeout of idempotent requests tightens to
+    timeout_multiplier times the endpoint's p99 latency, at least
+    min_timeout and at most the client's read timeout. Idempotent requests
+    which raise, or whose status is in RETRY_STATUSES, are retried up to
+    retries times after a jittered, exponential backoff.
+
+    A policy may be shared by clients; the hedges of sync requests are sent
+    from a pool of up to max_workers threads.
+    '''
+
+    DEFAULT_HEDGE_PERCENTILE = 0.95
+    DEFAULT_MAX_HEDGE_RATIO = 0.1
+    DEFAULT_MAX_WORKERS = 32
+    DEFAULT_MIN_SAMPLES = 20
+    DEFAULT_MIN_TIMEOUT = 1.0
+    DEFAULT_RETRIES = 2
+    DEFAULT_BACKOFF = 0.05
+    DEFAULT_MAX_BACKOFF = 2.0
+    DEFAULT_TIMEOUT_MULTIPLIER = 4
+    DEFAULT_WINDOW_SIZE = 256
+    BUDGET_DECAY_INTERVAL = 1000
+
+    def __init__(self,
+                 hedge=True,
+                 hedge_percentile=DEFAULT_HEDGE_PERCENTILE,
+                 max_hedge_ratio=DEFAULT_MAX_HEDGE_RATIO,
+                 retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF,
+                 max_backoff=DEFAULT_MAX_BACKOFF,
+                 adaptive_timeout=True,
+                 timeout_multiplier=DEFAULT_TIMEOUT_MULTIPLIER,
+                 min_timeout=DEFAULT_MIN_TIMEOUT,
+                 window_size=DEFAULT_WINDOW_SIZE,
+                 min_samples=DEFAULT_MIN_SAMPLES,
+                 max_workers=DEFAULT_MAX_WORKERS):
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.adaptive_timeout = adaptive_timeout
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self.windows = {}
+        self.requests = 0
+        self.hedges = 0
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def close(self):
+        '''Shut down the thread pool used to send hedged sync requests.'''
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor != None:
+            executor.shutdown(wait=False)
+
+    def idempotent(self, method):
+        '''Return whether requests with the given method are hedged, timed out and retried.'''
+        return method in IDEMPOTENT_METHODS
+
+    def hedge_delay(self, key):
+        '''Return the seconds after which a request to the given endpoint is hedged, or None if it is not.'''
+        with self.lock:
+            window = self.windows.get(key, None)
+            if not self.hedge or key[1] not in HEDGE_METHODS or window == None or len(window) < self.min_samples:
+                return None
+            return window.percentile(self.hedge_percentile)
+
+    def timeout(self, key, read_timeout):
+        '''Return the read timeout of a request to the given endpoint.'''
+        with self.lock:
+            window = self.windows.get(key, None)
+            if not self.adaptive_timeout or window == None or len(window) < self.min_samples:
+                return read_timeout
+            timeout = max(window.percentile(0.99) * self.timeout_multiplier, self.min_timeout)
+            return min(timeout, read_timeout) if read_timeout != None else timeout
+
+    def observe(self, key, latency):
+        '''Add a latency sample to the window of the given endpoint.'''
+        with self.lock:
+            window = self.windows.get(key, None)
+            if window == None:
+                window = self.windows[key] = LatencyWindow(self.window_size)
+            window.add(latency)
+
+    def call(self, host, method, endpoint, attempt, read_timeout, status, metrics=NULL_METRICS):
+        '''Call attempt(read_timeout) for the given request, hedging and retrying it; status(response) returns its status code.'''
+        key = (host, method, endpoint)
+        retry = 0
+        while True:
+            timeout = self.timeout(key, read_timeout)
+            try:
+                r = self.__hedged__(key, lambda: self.__timed__(key, attempt, timeout), metrics)
+            except Exception:
+                if retry >= self.retries:
+                    raise
+                r = None
+            if r != None and (status(r) not in RETRY_STATUSES or retry >= self.retries):
+                return r
+            delay = self.__backoff__(retry, r)
+            if delay == None:
+                return r
+            metrics.record_retry(method, endpoint, 'retry')
+            time.sleep(delay)
+            retry += 1
+
+    async def call_async(self, host, method, endpoint, attempt, read_timeout, status, metrics=NULL_METRICS):
+        '''Await attempt(read_timeout) for the given request, hedging and retrying it; status(response) returns its status code.'''
+        key = (host, method, endpoint)
+        retry = 0
+        while True:
+            timeout = self.timeout(key, read_timeout)
+            try:
+                r = await self.__hedged_async__(key, lambda: self.__timed_async__(key, attempt, timeout), metrics)
+            except Exception:
+                if retry >= self.retries:
+                    raise
+                r = None
+            if r != None and (status(r) not in RETRY_STATUSES or retry >= self.retries):
+                return r
+            delay = self.__backoff__(retry, r)
+            if delay == None:
+                return r
+            metrics.record_retry(method, endpoint, 'retry')
+            await asyncio.sleep(delay)
+            retry += 1
+
+    def __backoff__(self, retry, r):
+        '''Return the seconds to wait before the given retry, or None if the response asks for a longer wait than max_backoff.'''
+        delay = random.uniform(0, min(self.backoff * 2 ** retry, self.max_backoff))
+        requested = retry_after(r.headers) if r != None else None
+        if requested != None:
+            if requested > self.max_backoff:
+                return None
+            delay = max(delay, requested)
+        return delay
+
+    def __budget__(self, hedge):
+        '''Count a request, or a hedge if permitted by max_hedge_ratio; returns whether the hedge may be sent.'''
+        with self.lock:
+            if not hedge:
+                self.requests += 1
+                if self.requests >= HedgePolicy.BUDGET_DECAY_INTERVAL:
+                    self.requests //= 2
+                    self.hedges //= 2
+                return False
+            if self.hedges >= self.requests * self.max_hedge_ratio:
+                return False
+            self.hedges += 1
+            return True
+
+    def __hedged__(self, key, send, metrics):
+        delay = self.hedge_delay(key)
+        self.__budget__(False)
+        if delay == None:
+            return send()
+
+        # only the hedge occupies the shared pool; the request itself is sent on the caller's thread
+        completed = threading.Event()
+        hedge = self.__executor__().submit(contextvars.copy_context().run, self.__hedge__,
+                                           key, send, time.time() + delay, completed, metrics)
+        try:
+            r = send()
+        except Exception:
+            completed.set()
+            if hedge.exception() != None or hedge.result() is NOT_SENT:
+                raise
+            metrics.record_retry(key[1], key[2], 'hedge_won')
+            return hedge.result()
+        completed.set()
+        return r
+
+    def __hedge__(self, key, send, deadline, completed, metrics):
+        '''Send a hedge of the given request once its deadline passes, unless it has completed or the hedge budget is spent.'''
+        if completed.wait(max(deadline - time.time(), 0)) or not self.__budget__(True):
+            return NOT_SENT
+        metrics.record_retry(key[1], key[2], 'hedge')
+        return send()
+
+    async def __hedged_async__(self, key, send, metrics):
+        delay = self.hedge_delay(key)
+        self.__budget__(False)
+        if delay == None:
+            return await send()
+
+        pending = set([asyncio.ensure_future(send())])
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if len(done) == 0 and self.__budget__(True):
+                metrics.record_retry(key[1], key[2], 'hedge')
+                pending.add(asyncio.ensure_future(send()))
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() == None or len(pending) == 0:
+                        if future.exception() == None and len(pending) > 0:
+                            metrics.record_retry(key[1], key[2], 'hedge_won')
+                        return future.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def __executor__(self):
+        with self.lock:
+            if self.executor == None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='prvd-hedge')
+            return self.executor
+
+    def __timed__(self, key, attempt, timeout):
+        started = time.time()
+        try:
+            r = attempt(timeout)
+        except Exception:
+            self.__timed_out__(key, started, timeout)
+            raise
+        self.observe(key, time.time() - started)
+        return r
+
+    async def __timed_async__(self, key, attempt, timeout):
+        started = time.time()
+        try:
+            r = await attempt(timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.__timed_out__(key, started, timeout)
+            raise
+        self.observe(key, time.time() - started)
+        return r
+
+    def __timed_out__(self, key, started, timeout):
+        '''Observe the elapsed time of a failed attempt if it timed out, so a slowing endpoint's timeout widens.'''
+        elapsed = time.time() - started
+        if timeout != None and elapsed >= timeout:
+            self.observe(key, elapsed)
@@ -16,17 +16,17 @@
 
 import os
 
-from api_client import APIClient
+from .api_client import APIClient
 
 
 class Ident(APIClient):
 
     DEFAULT_HOST = 'ident.provide.services'
 
-    def __init__(self, token):
+    def __init__(self, token, **kwargs):
         scheme = os.environ.get('IDENT_API_SCHEME', Ident.DEFAULT_SCHEME)
         host = os.environ.get('IDENT_API_HOST', Ident.DEFAULT_HOST)
-        super(Ident, self).__init__(scheme, host, token) 
+        super(Ident, self).__init__(scheme, host, token, **kwargs)
         
     def create_application(self, params):
         return self.post('applications', params)
@@ -37,21 +37,39 @@ class Ident(APIClient):
     def fetch_applications(self, params):
         return self.get('applications', params)
 
+    def iter_applications(self, params, **kwargs):
+        return self.paginate('applications', params, **kwargs)
+
     def fetch_application_details(self, app_id):
         return self.get('applications/{}'.format(app_id), {})
 
+    def fetch_many_applications(self, ids, **kwargs):
+        return self.fetch_many(self.fetch_application_details, ids, **kwargs)
+
     def fetch_application_tokens(self, app_id):
         return self.get('applications/{}/tokens'.format(app_id), {})
 
+    def iter_application_tokens(self, app_id, params=None, **kwargs):
+        return self.paginate('applications/{}/tokens'.format(app_id), params, **kwargs)
+
     def authenticate(self, params):
         return self.post('authenticate', params)
 
+    def create_token(self, params):
+        return self.post('tokens', params)
+
     def fetch_tokens(self, params):
         return self.get('tokens', params)
 
+    def iter_tokens(self, params, **kwargs):
+        return self.paginate('tokens', params, **kwargs)
+
     def fetch_token_details(self, token_id):
         return self.get('tokens/{}'.format(token_id), {})
 
+    def fetch_many_tokens(self, ids, **kwargs):
+        return self.fetch_many(self.fetch_token_details, ids, **kwargs)
+
     def delete_token(self, token_id):
         return self.delete('tokens/{}'.format(token_id))
 
@@ -61,9 +79,15 @@ class Ident(APIClient):
     def fetch_users(self):
         return self.get('users', {})
 
+    def iter_users(self, params=None, **kwargs):
+        return self.paginate('users', params, **kwargs)
+
     def fetchUserDetails(self, user_id):
         return self.get('users/{}'.format(user_id), {})
 
+    def fetch_many_users(self, ids, **kwargs):
+        return self.fetch_many(self.fetchUserDetails, ids, **kwargs)
+
     def update_user(self, user_id, params):
         return self.put('users/{}'.format(user_id), params)
 
@@ -76,5 +100,11 @@ class Ident(APIClient):
     def fetch_kyc_applications(self, params):
         return self.get('kyc_applications', params)
 
+    def iter_kyc_applications(self, params, **kwargs):
+        return self.paginate('kyc_applications', params, **kwargs)
+
     def fetch_kyc_application_details(self, kyc_app_id):
         return self.get('kyc_applications/{}'.format(kyc_app_id), {})
+
+    def fetch_many_kyc_applications(self, ids, **kwargs):
+        return self.fetch_many(self.fetch_kyc_application_details, ids, **kwargs)
@@ -14,16 +14,112 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 
-import ipfshttpclient
-import jwt
 import logging
-import socket
+import mmap
+import os
+import threading
 import uuid
 
-from goldmine import Goldmine
-from ident import Ident
-from ipfshttpclient.multipart import BytesFileStream
-from urlparse import urlparse
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from .connector_pool import ROUTING_LEAST_OUTSTANDING, ConnectorPool, connector_nodes
+from .envelope import HEADER, decode_message, index_entry_range, parse_header, parse_index_entry
+from .goldmine import Goldmine
+from .ident import Ident
+from .publisher import Publisher
+from .subscription import Subscription
+from .token_provider import token_provider
+
+
+def message_source(msg, chunk_size):
+    '''Return the filename, chunks and size in bytes of a message to be streamed to IPFS.
+
+    A message may be bytes, a bytearray, memoryview or memory-mapped file, an open
+    binary file object or an os.PathLike path such as a pathlib.Path; a str is
+    published as its UTF-8 encoding, never read as a path. Buffers are sliced
+    without copying and files are read one chunk at a time, so the message is
+    never materialized in memory.
+    '''
+    if isinstance(msg, str):
+        msg = msg.encode('utf-8')
+    if isinstance(msg, bytes):
+        return None, (msg,), len(msg)
+    if isinstance(msg, (bytearray, memoryview, mmap.mmap)):
+        view = memoryview(msg).cast('B')
+        return None, (view,), view.nbytes
+    if hasattr(msg, 'read'):
+        name = getattr(msg, 'name', None)
+        try:
+            size = os.fstat(msg.fileno()).st_size - msg.tell()
+        except (AttributeError, OSError, ValueError):
+            size = None
+        return os.path.basename(name) if isinstance(name, str) else None, read_chunks(msg, chunk_size), size
+    if isinstance(msg, os.PathLike):
+        path = os.fspath(msg)
+        return os.path.basename(path), read_chunks(path, chunk_size), os.path.getsize(path)
+    raise TypeError('unsupported message type: {}'.format(type(msg).__name__))
+
+
+def content_range(content, offset, length):
+    '''Return the given range of the given content, as IPFS cat would.'''
+    offset = offset or 0
+    return content[offset:offset + length if length != None else len(content)]
+
+
+def read_chunks(file, chunk_size):
+    '''Yield the contents of the given file object or path in chunks of at most chunk_size bytes.'''
+    f = open(file, 'rb') if not hasattr(file, 'read') else file
+    try:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        if f is not file:
+            f.close()
+
+
+def message_bus_application(application_id, status, application):
+    '''Return the given application details if they were fetched and describe a message bus application, or None.'''
+    if status != 200:
+        logging.warning('failed to resolve message bus application by id: {}'.format(application_id))
+        return None
+    app_type = application.get('config', {}).get('type', None)
+    if app_type != MessageBus.APPLICATION_TYPE_MESSAGE_BUS:
+        logging.warning('failed to resolve message bus application by id: {}; application type: {}'.format(application_id, app_type))
+        return None
+    logging.info('resolved message bus application by id: {}'.format(application_id))
+    return application
+
+
+def registry_contract(application_id, contracts):
+    '''Return the first registry contract among the given contract details, or None; contracts is None if they could not be listed.'''
+    if contracts == None:
+        logging.warning('failed to resolve on-chain registry contract for application_id: {}'.format(application_id))
+        return None
+    for contract in contracts:
+        contract_type = contract.get('params', {}).get('type', None)
+        if contract_type == MessageBus.CONTRACT_TYPE_REGISTRY:
+            logging.info('resolved on-chain registry contract for application_id: {}; address: {}'.format(application_id, contract.get('address', None)))
+            return contract
+        logging.warning('failed to resolve on-chain registry contract for application_id: {}; contract type: {}'.format(application_id, contract_type))
+    return None
+
+
+def ipfs_connectors(application_id, connectors):
+    '''Return the IPFS connectors among the given connector details; connectors is None if they could not be listed.'''
+    if connectors == None:
+        logging.warning('failed to resolve distributed filesystem connector for application_id: {}'.format(application_id))
+        return []
+    selected = []
+    for connector in connectors:
+        connector_type = connector.get('type', None)
+        if connector_type == MessageBus.CONNECTOR_TYPE_IPFS:
+            logging.info('resolved distributed filesystem connector for application_id: {}; type: {}'.format(application_id, connector_type))
+            selected.append(connector)
+        else:
+            logging.warning('failed to resolve distributed filesystem connector for application_id: {}; connector type: {}'.format(application_id, connector_type))
+    return selected
 
 
 class MessageBus(Goldmine):
@@ -33,101 +129,272 @@ class MessageBus(Goldmine):
     CONTRACT_METHOD_PUBLISH = 'publish'
     CONTRACT_TYPE_REGISTRY = 'registry'
     DEFAULT_MULTIPART_CHUNK_SIZE = 4096
+    DEFAULT_RESOLVE_CONCURRENCY = 8
+    RESOLUTION_BACKGROUND = 'background'
+    RESOLUTION_EAGER = 'eager'
+    RESOLUTION_LAZY = 'lazy'
 
-    def __init__(self, token, account_address, multipart_chunk_size=DEFAULT_MULTIPART_CHUNK_SIZE):
-        '''Initialize a message bus instance.'''
-        super(MessageBus, self).__init__(token)
-        self.ident = Ident(token)
-        self.decode_jwt(token)
+    def __init__(self, token, account_address, multipart_chunk_size=DEFAULT_MULTIPART_CHUNK_SIZE,
+                 resolution_cache=None, resolve_concurrency=DEFAULT_RESOLVE_CONCURRENCY,
+                 publish_workers=Publisher.DEFAULT_WORKERS, publish_queue_size=Publisher.DEFAULT_QUEUE_SIZE,
+                 resolution=RESOLUTION_EAGER, blob_cache=None, routing=ROUTING_LEAST_OUTSTANDING, **kwargs):
+        '''Initialize a message bus instance; additional keyword arguments configure the shared HTTP connection pools.
+
+        With eager resolution the application, registry contract and connector are
+        resolved and the IPFS session is opened before returning. Lazy resolution
+        defers this work until the message bus is first used, and background
+        resolution starts it on a background thread immediately. An optional BlobCache
+        serves reads of IPFS content and is written through by ipfs_add(). IPFS requests
+        are routed across every resolved connector according to routing; see ConnectorPool.
+        '''
+        super(MessageBus, self).__init__(token, **kwargs)
+        self.ident = Ident(self.tokens, **kwargs)
+        self.application_id = None
+        # a token provider without a token yet is decoded on first resolution, so construction never blocks on a refresh
+        if self.tokens == None or self.tokens.available():
+            self.decode_jwt(self.tokens)
         self.account_address = account_address
         self.multipart_chunk_size = multipart_chunk_size
-        self.resolve()
-        self.init_ipfs()
+        self.resolution_cache = resolution_cache
+        self.blob_cache = blob_cache
+        self.resolve_concurrency = resolve_concurrency
+        self.publish_workers = publish_workers
+        self.publish_queue_size = publish_queue_size
+        self.publisher = None
+        self.publisher_lock = threading.Lock()
+        self.application = None
+        self.contract = None
+        self.connector = None
+        self.connectors = []
+        self.routing = routing
+        self.ipfsclient = None
+        self.ipfs_pool = None
+        self.prober = None
+        self.ready = None
+        self.ready_lock = threading.Lock()
+        if resolution == MessageBus.RESOLUTION_EAGER:
+            self.resolve()
+            self.init_ipfs()
+            self.ready = Future()
+            self.ready.set_result(None)
+        elif resolution == MessageBus.RESOLUTION_BACKGROUND:
+            self.warm()
+        elif resolution != MessageBus.RESOLUTION_LAZY:
+            raise Exception('unsupported message bus resolution: {}'.format(resolution))
+
+    def warm(self):
+        '''Resolve the message bus and initialize the IPFS client session in the background unless already underway; returns a future.'''
+        with self.ready_lock:
+            if self.ready == None:
+                self.ready = Future()
+                thread = threading.Thread(target=self.__open__, args=(self.ready,), name='prvd-message-bus-resolve')
+                thread.daemon = True
+                thread.start()
+            return self.ready
 
     def init_ipfs(self):
-        '''Initialize an IPFS client session.'''
-        self.ipfsclient = None
+        '''Initialize an IPFS client session with every address of every resolved connector.'''
+        self.__close_ipfs__()
 
         if self.connector == None:
             raise Exception('unable to establish IPFS client connection without resolution of a distributed filesystem connector')
 
-        connector_addr = self.resolve_connector_multiaddr()
-        if connector_addr == None:
+        with self.metrics.stage('resolve_connector_multiaddr'):
+            nodes = connector_nodes(self.connectors or [self.connector])
+        if len(nodes) == 0:
             raise Exception('unable to establish IPFS client connection without resolution of configured distributed filesystem connector')
 
-        self.ipfsclient = ipfshttpclient.connect(addr=connector_addr,
-                                                 chunk_size=self.multipart_chunk_size,
-                                                 session=True)
+        import ipfshttpclient
+
+        pool = ConnectorPool(nodes, routing=self.routing,
+                             transport_errors=(ipfshttpclient.exceptions.ConnectionError, ipfshttpclient.exceptions.TimeoutError))
+        executor = ThreadPoolExecutor(max_workers=min(len(nodes), self.resolve_concurrency))
+        try:
+            with self.metrics.stage('ipfs_connect'):
+                for node, e in zip(nodes, executor.map(self.__connect__, nodes)):
+                    if e != None:
+                        pool.eject(node, e)
+        finally:
+            executor.shutdown()
+
+        connected = [node for node in nodes if node.client != None]
+        if len(connected) == 0:
+            raise Exception('unable to establish IPFS client connection to any configured distributed filesystem connector')
+        self.ipfs_pool = pool
+        self.prober = ThreadPoolExecutor(max_workers=1)
+        self.ipfsclient = connected[0].client
 
     def close(self):
         '''Free resources and exit.'''
-        if self.ipfsclient != None:
-            self.ipfsclient.close()
+        if self.ready != None:
+            wait([self.ready])
+        if self.publisher != None:
+            self.publisher.close()
+            self.publisher = None
+        self.__close_ipfs__()
+        self.ident.close()
+        super(MessageBus, self).close()
+
+    def flush(self, timeout=None):
+        '''Wait for all messages submitted to the publish pipeline to be published.'''
+        if self.publisher == None:
+            return True
+        return self.publisher.flush(timeout)
+
+    drain = flush
 
     def decode_jwt(self, token):
-        '''Decode the given JWT.'''
-        token = jwt.decode(token, verify=False)
-        subparts = token['sub'].split(':')
+        '''Resolve the application id from the subject of the given JWT or TokenProvider; decoded claims are cached.'''
+        claims = token_provider(token).claims()
+        subparts = claims['sub'].split(':')
         self.application_id = subparts[len(subparts) - 1]
         logging.info('resolved application id from JWT subject: {}'.format(self.application_id))
 
     def ipfs_add(self, msg, **kwargs):
-        '''Add the given file to IPFS.'''
+        '''Add the given file to IPFS, streaming it in multipart_chunk_size chunks; see message_source() for accepted types.'''
+        from ipfshttpclient.multipart import BytesFileStream
+
+        self.__ensure_ready__()
         if self.ipfsclient == None:
             raise Exception('unable to add file to IPFS without resolution of configured connector')
 
-        filename = kwargs.pop('filename', '{}.bytes'.format(uuid.uuid4()))
+        name, chunks, _ = message_source(msg, self.multipart_chunk_size)
+        filename = kwargs.pop('filename', name or '{}.bytes'.format(uuid.uuid4()))
+        wrap_with_directory = kwargs.pop('wrap_with_directory', False)
         kwargs.setdefault('opts', {}).update({
-            'wrap-with-directory': kwargs.pop('wrap_with_directory', False),
+            'wrap-with-directory': wrap_with_directory,
         }, **kwargs)
 
-        stream = BytesFileStream(msg, name=filename, chunk_size=self.multipart_chunk_size)
+        writer = self.blob_cache.writer() if self.blob_cache != None and not wrap_with_directory else None
+        if writer != None:
+            chunks = writer.tee(chunks)
+
+        stream = BytesFileStream(chunks, name=filename, chunk_size=self.multipart_chunk_size)
         body, headers = stream.body(), stream.headers()
-        return self.ipfsclient._client.request('/add', decoder='json', data=body, headers=headers, **kwargs)
+        try:
+            resp = self.__route__(lambda node: node.client._client.request('/add', decoder='json', data=body, headers=headers, **kwargs))
+        except Exception:
+            if writer != None:
+                writer.abort()
+            raise
+        if writer != None:
+            writer.commit(resp[len(resp) - 1]['Hash'])
+        return resp
 
-    def publish_message(self, subject, msg, **kwargs):
-        '''Publish a message.'''
-        if self.contract == None:
-            raise Exception('unable to publish message without resolution of an on-chain registry contract')
+    def ipfs_cat(self, msghash, offset=None, length=None, **kwargs):
+        '''Return the content of the given IPFS hash, or the given range of it; content served from the blob cache is a memory-mapped memoryview.'''
+        if self.blob_cache != None:
+            content = self.blob_cache.get(msghash)
+            if content != None:
+                return content_range(content, offset, length)
 
+        self.__ensure_ready__()
         if self.ipfsclient == None:
-            raise Exception('unable to publish message without resolution of configured connector')
+            raise Exception('unable to fetch file from IPFS without resolution of configured connector')
+        content = self.__route__(lambda node: node.client.cat(msghash, offset=offset, length=length, **kwargs))
+        if self.blob_cache != None and offset == None and length == None:
+            self.blob_cache.set(msghash, content)
+        return content
 
-        resp = self.ipfs_add(msg, **kwargs)
+    def add_message(self, msg, **kwargs):
+        '''Add the given message to IPFS; returns its hash.'''
+        try:
+            with self.metrics.stage('ipfs_add'):
+                resp = self.ipfs_add(msg, **kwargs)
+        except Exception:
+            self.invalidate_resolution()
+            raise
         msghash = resp[len(resp) - 1]['Hash']
-        logging.info('published {}-byte raw message to IPFS; hash: {}'.format(len(msg), msghash))
+        logging.info('published {}-byte raw message to IPFS; hash: {}'.format(resp[len(resp) - 1].get('Size', None), msghash))
+        return msghash
 
-        status, _, _ = self.execute_contract(self.contract.get('id'), {
-            'method': MessageBus.CONTRACT_METHOD_PUBLISH,
-            'params': [subject, msghash],
-            'value': 0,
-            'account_address': self.account_address,
-        })
+    def register_message(self, subject, msghash):
+        '''Register the given IPFS hash on a subject with the on-chain registry contract; returns the execution status.'''
+        with self.metrics.stage('execute_contract'):
+            status, _, _ = self.execute_contract(self.contract.get('id'), {
+                'method': MessageBus.CONTRACT_METHOD_PUBLISH,
+                'params': [subject, msghash],
+                'value': 0,
+                'account_address': self.account_address,
+            })
         if status == 202:
             logging.info('published message on subject: {}'.format(subject))
         else:
             logging.warning('failed to publish message on subject: {}'.format(subject))
+            self.invalidate_resolution()
+        return status
+
+    def publish_message(self, subject, msg, **kwargs):
+        '''Publish a message; returns its IPFS hash and the contract execution status.'''
+        self.__require_publishable__()
+        with self.metrics.stage('publish_message'):
+            msghash = self.add_message(msg, **kwargs)
+            return msghash, self.register_message(subject, msghash)
+
+    def submit_message(self, subject, msg, **kwargs):
+        '''Enqueue a message on the publish pipeline; returns a future resolving to its IPFS hash and the contract execution status.'''
+        self.__require_publishable__()
+        if self.publisher == None:
+            with self.publisher_lock:
+                if self.publisher == None:
+                    self.publisher = Publisher(self, workers=self.publish_workers, queue_size=self.publish_queue_size)
+        return self.publisher.publish(subject, msg, **kwargs)
+
+    def fetch_message(self, msghash, **kwargs):
+        '''Fetch the content of the message with the given IPFS hash.'''
+        with self.metrics.stage('ipfs_cat'):
+            return self.ipfs_cat(msghash, **kwargs)
+
+    def fetch_batched_message(self, msghash, index):
+        '''Fetch the message at the given index of the envelope with the given IPFS hash, reading only the envelope header, its index entry and the message.'''
+        with self.metrics.stage('ipfs_cat'):
+            count, compression = parse_header(self.ipfs_cat(msghash, offset=0, length=HEADER.size))
+            if index < 0 or index >= count:
+                raise IndexError('envelope message index out of range: {}'.format(index))
+            offset, length = index_entry_range(index)
+            offset, length = parse_index_entry(self.ipfs_cat(msghash, offset=offset, length=length))
+            return decode_message(self.ipfs_cat(msghash, offset=offset, length=length), compression)
+
+    def subscribe(self, subject, prefetch=Subscription.DEFAULT_PREFETCH, concurrency=Subscription.DEFAULT_CONCURRENCY, **kwargs):
+        '''Subscribe to the messages published on a subject; iterating the returned subscription yields (IPFS hash, message) tuples in order.
+
+        Additional keyword arguments configure the polling of the registry contract; see NetworkFollower.
+        '''
+        self.__ensure_ready__()
+        return Subscription(self, subject, prefetch=prefetch, concurrency=concurrency, **kwargs)
+
+    def invalidate_resolution(self):
+        '''Remove any cached resolution of this message bus so the next resolve() starts fresh.'''
+        if self.resolution_cache != None and self.application_id != None:
+            self.resolution_cache.invalidate(self.application_id)
 
     def resolve(self):
         '''Resolve the application, on-chain registry contract and distributed filesystem connector.'''
-        self.resolve_application()
-        self.resolve_registry_contract()
-        self.resolve_connector()
+        if self.application_id == None:
+            self.decode_jwt(self.tokens)
+        if self.__resolve_cached__():
+            return
+
+        executor = ThreadPoolExecutor(max_workers=3)
+        try:
+            with self.metrics.stage('resolve'):
+                resolutions = [executor.submit(self.resolve_application),
+                               executor.submit(self.resolve_registry_contract),
+                               executor.submit(self.resolve_connector)]
+                for resolution in resolutions:
+                    resolution.result()
+        finally:
+            executor.shutdown()
+
+        if self.resolution_cache != None and self.application != None and self.contract != None and self.connector != None:
+            self.resolution_cache.set(self.application_id, self.application, self.contract, self.connector, self.connectors)
 
     def resolve_application(self):
         '''Resolve the message bus application.'''
         logging.info('resolving message bus application')
         self.application = None
         status, _, resp = self.ident.fetch_application_details(self.application_id)
-        if status == 200:
-            app_type = resp.get('config', {}).get('type', None)
-            if app_type == MessageBus.APPLICATION_TYPE_MESSAGE_BUS:
-                logging.info('resolved message bus application by id: {}'.format(self.application_id))
-                self.application = resp
-            else:
-                logging.warning('failed to resolve message bus application by id: {}; application type: {}'.format(self.application_id, app_type))
-        else:
-            logging.warning('failed to resolve message bus application by id: {}'.format(self.application_id))
+        self.application = message_bus_application(self.application_id, status, resp)
 
     def resolve_registry_contract(self):
         '''Resolve the on-chain registry contract for the message bus.'''
@@ -136,45 +403,117 @@ class MessageBus(Goldmine):
         status, _, resp = self.fetch_contracts({
             'application_id': self.application_id,
         })
-        if status == 200:
-            for item in resp:
-                _, _, contract = self.fetch_contract_details(item.get('id', None))
-                contract_type = contract.get('params', {}).get('type', None)
-                if contract_type == MessageBus.CONTRACT_TYPE_REGISTRY:
-                    logging.info('resolved on-chain registry contract for application_id: {}; address: {}'.format(self.application_id, contract.get('address', None)))
-                    self.contract = contract
-                    break
-                else:
-                    logging.warning('failed to resolve on-chain registry contract for application_id: {}; contract type: {}'.format(self.application_id, contract_type))
-        else:
-            logging.warning('failed to resolve on-chain registry contract for application_id: {}'.format(self.application_id))
+        contracts = self.__fetch_details__(self.fetch_contract_details, resp) if status == 200 else None
+        self.contract = registry_contract(self.application_id, contracts)
 
     def resolve_connector(self):
-        '''Resolve the distributed filesystem connector for the message bus.'''
+        '''Resolve the distributed filesystem connectors for the message bus.'''
         logging.info('resolving distributed filesystem connector for message bus')
         self.connector = None
+        self.connectors = []
         status, _, resp = self.fetch_connectors({
             'application_id': self.application_id,
         })
-        if status == 200:
-            for item in resp:
-                _, _, connector = self.fetch_connector_details(item.get('id', None))
-                connector_type = connector.get('type', None)
-                if connector_type == MessageBus.CONNECTOR_TYPE_IPFS:
-                    logging.info('resolved distributed filesystem connector for application_id: {}; type: {}'.format(self.application_id, connector_type))
-                    self.connector = connector
-                    break
-                else:
-                    logging.warning('failed to resolve distributed filesystem connector for application_id: {}; connector type: {}'.format(self.application_id, connector_type))
-        else:
-            logging.warning('failed to resolve distributed filesystem connector for application_id: {}'.format(self.application_id))
+        connectors = self.__fetch_details__(self.fetch_connector_details, resp) if status == 200 else None
+        self.connectors = ipfs_connectors(self.application_id, connectors)
+        self.connector = self.connectors[0] if len(self.connectors) > 0 else None
 
     def resolve_connector_multiaddr(self):
         '''Resolve a distributed filesystem connector multiaddr for IPFS.'''
-        api_url = self.connector.get('config', {}).get('api_url', None)
-        if api_url == None:
-            logging.warning('unable to resolve connector multiaddr without api_url')
+        with self.metrics.stage('resolve_connector_multiaddr'):
+            nodes = connector_nodes([self.connector])
+        if len(nodes) == 0:
+            logging.warning('unable to resolve connector multiaddr')
             return None
-        url = urlparse(api_url)
-        ip = socket.gethostbyname(url.hostname)
-        return '/ip4/{}/tcp/{}'.format(ip, url.port)
+        return nodes[0].multiaddr
+
+    def __close_ipfs__(self):
+        if self.prober != None:
+            self.prober.shutdown(wait=False)
+            self.prober = None
+        if self.ipfs_pool != None:
+            for node in self.ipfs_pool.nodes:
+                if node.client != None:
+                    node.client.close()
+                    node.client = None
+            self.ipfs_pool = None
+        self.ipfsclient = None
+
+    def __connect__(self, node):
+        import ipfshttpclient
+
+        try:
+            node.client = ipfshttpclient.connect(addr=node.multiaddr, chunk_size=self.multipart_chunk_size, session=True)
+        except Exception as e:
+            logging.warning('failed to establish IPFS client connection to {}; {}'.format(node.multiaddr, e))
+            return e
+        return None
+
+    def __probe__(self, node):
+        try:
+            if node.client == None:
+                error = self.__connect__(node)
+                if error != None:
+                    raise error
+            else:
+                node.client.version()
+        except Exception as e:
+            self.ipfs_pool.probed(node, e)
+            return
+        self.ipfs_pool.probed(node)
+
+    def __route__(self, fn):
+        pool = self.ipfs_pool
+        for node in pool.due_for_probe():
+            self.prober.submit(self.__probe__, node)
+        return pool.call(fn)
+
+    def __fetch_details__(self, fetch, items):
+        ids = [item.get('id', None) for item in items]
+        if len(ids) == 0:
+            return
+        executor = ThreadPoolExecutor(max_workers=min(len(ids), self.resolve_concurrency))
+        try:
+            for _, _, details in executor.map(fetch, ids):
+                yield details
+        finally:
+            executor.shutdown(wait=False)
+
+    def __ensure_ready__(self):
+        ready = self.ready
+        if ready == None:
+            ready = self.warm()
+        ready.result()
+
+    def __open__(self, ready):
+        try:
+            self.resolve()
+            self.init_ipfs()
+        except Exception as e:
+            logging.warning('failed to resolve message bus for application_id: {}; {}'.format(self.application_id, e))
+            with self.ready_lock:
+                self.ready = None
+            ready.set_exception(e)
+            return
+        ready.set_result(None)
+
+    def __require_publishable__(self):
+        self.__ensure_ready__()
+        if self.contract == None:
+            raise Exception('unable to publish message without resolution of an on-chain registry contract')
+
+        if self.ipfsclient == None:
+            raise Exception('unable to publish message without resolution of configured connector')
+
+    def __resolve_cached__(self):
+        if self.resolution_cache == None:
+            return False
+        entry = self.resolution_cache.get(self.application_id)
+        if entry == None:
+            return False
+        logging.info('resolved message bus from cache for application_id: {}'.format(self.application_id))
+        self.application = entry.get('application', None)
+        self.contract = entry.get('contract', None)
+        self.connector = entry.get('connector', None)
+        self.connectors = entry.get('connectors', None) or [self.connector]
+        return True
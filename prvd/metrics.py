@@ -0,0 +1,211 @@
+'''Latency and throughput instrumentation for API clients and the message bus.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import json
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+
+def endpoint_template(uri):
+    '''Return the logical endpoint for the given uri with resource ids templated away, e.g. networks/{id}/blocks.'''
+    segments = uri.strip('/').split('/')
+    return '/'.join('{id}' if i % 2 == 1 else segment for i, segment in enumerate(segments))
+
+
+class Metrics(object):
+    '''No-op metrics sink and the interface for pluggable implementations.
+
+    Clients skip all timing and accounting when enabled is False, so the
+    default instance adds no overhead.
+    '''
+
+    enabled = False
+
+    def record_request(self, method, endpoint, status, elapsed, request_bytes, response_bytes, reused):
+        '''Record an API request; status is None if it failed without a response and reused is None if unknown.'''
+        pass
+
+    def record_stage(self, stage, elapsed):
+        '''Record the duration of a named stage, e.g. of the message bus publish path.'''
+        pass
+
+    def record_schedule(self, method, endpoint, priority, waited, queue_depth):
+        '''Record the time a request waited for the scheduler and the number of requests queued ahead of it.'''
+        pass
+
+    def record_retry(self, method, endpoint, kind):
+        '''Record a hedged, retried or timed out attempt of an idempotent request.'''
+        pass
+
+    def record_compression(self, method, endpoint, direction, raw_bytes, wire_bytes):
+        '''Record the decoded and encoded sizes of a compressed 'request' or 'response' body.'''
+        pass
+
+    def stage(self, stage):
+        '''Return a context manager recording the duration of the named stage.'''
+        return NULL_TIMER
+
+
+class StageTimer(object):
+    '''Context manager recording its duration as a stage on a metrics sink.'''
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.metrics.record_stage(self.stage, time.time() - self.started)
+        return False
+
+
+class NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+NULL_TIMER = NullTimer()
+NULL_METRICS = Metrics()
+
+
+class MetricsAggregator(Metrics):
+    '''Thread-safe, in-process aggregation of request, compression, retry, scheduling and stage metrics.
+
+    Requests, their compression, retries and scheduling are aggregated per
+    method and templated endpoint; compressed bodies are totalled per
+    direction, retries are counted per kind, and latencies and scheduler
+    wait times are kept as histograms with one bucket per upper bound in
+    LATENCY_BUCKETS.
+    snapshot() returns the aggregates as a dict and dump() writes them as JSON.
+    '''
+
+    enabled = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def record_request(self, method, endpoint, status, elapsed, request_bytes, response_bytes, reused):
+        key = '{} {}'.format(method, endpoint)
+        with self.lock:
+            entry = self.requests.get(key, None)
+            if entry == None:
+                entry = self.requests[key] = {
+                    'count': 0,
+                    'errors': 0,
+                    'status': {},
+                    'latency': self.__histogram__(),
+                    'request_bytes': 0,
+                    'response_bytes': 0,
+                    'connections_reused': 0,
+                    'connections_opened': 0,
+                }
+            entry['count'] += 1
+            if status == None:
+                entry['errors'] += 1
+            else:
+                entry['status'][str(status)] = entry['status'].get(str(status), 0) + 1
+            self.__observe__(entry['latency'], elapsed)
+            entry['request_bytes'] += request_bytes
+            entry['response_bytes'] += response_bytes
+            if reused == True:
+                entry['connections_reused'] += 1
+            elif reused == False:
+                entry['connections_opened'] += 1
+
+    def record_stage(self, stage, elapsed):
+        with self.lock:
+            histogram = self.stages.get(stage, None)
+            if histogram == None:
+                histogram = self.stages[stage] = self.__histogram__()
+            self.__observe__(histogram, elapsed)
+
+    def record_schedule(self, method, endpoint, priority, waited, queue_depth):
+        key = '{} {}'.format(method, endpoint)
+        with self.lock:
+            entry = self.schedule.get(key, None)
+            if entry == None:
+                entry = self.schedule[key] = {
+                    'priority': {},
+                    'wait': self.__histogram__(),
+                    'queue_depth_sum': 0,
+                    'queue_depth_max': 0,
+                }
+            entry['priority'][str(priority)] = entry['priority'].get(str(priority), 0) + 1
+            self.__observe__(entry['wait'], waited)
+            entry['queue_depth_sum'] += queue_depth
+            entry['queue_depth_max'] = max(entry['queue_depth_max'], queue_depth)
+
+    def record_compression(self, method, endpoint, direction, raw_bytes, wire_bytes):
+        key = '{} {}'.format(method, endpoint)
+        with self.lock:
+            entry = self.compression.setdefault(key, {})
+            totals = entry.get(direction, None)
+            if totals == None:
+                totals = entry[direction] = {'count': 0, 'raw_bytes': 0, 'wire_bytes': 0, 'saved_bytes': 0}
+            totals['count'] += 1
+            totals['raw_bytes'] += raw_bytes
+            totals['wire_bytes'] += wire_bytes
+            totals['saved_bytes'] += raw_bytes - wire_bytes
+
+    def record_retry(self, method, endpoint, kind):
+        key = '{} {}'.format(method, endpoint)
+        with self.lock:
+            entry = self.retries.setdefault(key, {})
+            entry[kind] = entry.get(kind, 0) + 1
+
+    def stage(self, stage):
+        return StageTimer(self, stage)
+
+    def snapshot(self):
+        '''Return a copy of the aggregated metrics.'''
+        with self.lock:
+            return json.loads(json.dumps({'compression': self.compression, 'requests': self.requests,
+                                           'retries': self.retries, 'schedule': self.schedule, 'stages': self.stages}))
+
+    def dump(self, fp):
+        '''Write the aggregated metrics to the given file object as JSON.'''
+        json.dump(self.snapshot(), fp, indent=2, sort_keys=True)
+
+    def reset(self):
+        '''Discard all aggregated metrics.'''
+        with self.lock:
+            self.requests = {}
+            self.compression = {}
+            self.retries = {}
+            self.schedule = {}
+            self.stages = {}
+
+    def __histogram__(self):
+        return {'count': 0, 'sum': 0.0, 'max': 0.0, 'buckets': [0] * len(LATENCY_BUCKETS)}
+
+    def __observe__(self, histogram, elapsed):
+        histogram['count'] += 1
+        histogram['sum'] += elapsed
+        histogram['max'] = max(histogram['max'], elapsed)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                histogram['buckets'][i] += 1
+                break
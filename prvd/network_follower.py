@@ -0,0 +1,204 @@
+'''Incremental, checkpointed following of network blocks and transactions.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from .cache_files import cache_dir, write_json
+
+
+def item_key(item):
+    '''Return the key identifying the given block or transaction.'''
+    key = item.get('id', None)
+    return key if key != None else item.get('hash', None)
+
+
+class NetworkFollower(object):
+    '''Tails the blocks and transactions of a network from a persisted cursor.
+
+    Goldmine lists blocks and transactions newest first, so each poll walks
+    pages only until it reaches an item already seen; items are downloaded
+    and decoded once. The keys of the most recently seen items are
+    checkpointed to disk after each batch has been consumed, so a restarted
+    follower resumes where it left off. A batch interrupted before it was
+    fully consumed is yielded again after a restart.
+
+    The polling interval tracks the observed block rate between the minimum
+    and maximum intervals, and backs off while no new items arrive.
+    '''
+
+    BLOCKS = 'blocks'
+    TRANSACTIONS = 'transactions'
+
+    DEFAULT_MIN_INTERVAL = 1.0
+    DEFAULT_MAX_INTERVAL = 60.0
+    DEFAULT_MAX_PAGES = 100
+    DEFAULT_RPP = 100
+    BACKOFF = 1.5
+    SMOOTHING = 0.3
+
+    def __init__(self, client, network_id,
+                 kinds=(BLOCKS, TRANSACTIONS),
+                 params=None,
+                 path=None,
+                 rpp=DEFAULT_RPP,
+                 max_pages=DEFAULT_MAX_PAGES,
+                 min_interval=DEFAULT_MIN_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL):
+        self.client = client
+        self.network_id = network_id
+        self.kinds = tuple(kinds)
+        self.params = dict(params or {})
+        self.path = os.path.join(cache_dir(path), 'follower')
+        self.rpp = rpp
+        self.max_pages = max_pages
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.block_interval = None
+        self.polled_at = None
+        self.cursors = dict((kind, []) for kind in self.kinds)
+        self.pending = None
+        self.stopped = threading.Event()
+        self.__load__()
+
+    def follow(self):
+        '''Yield a (kind, item) tuple for each new block or transaction, oldest first, until stopped.'''
+        while not self.stopped.is_set():
+            for kind, item in self.poll():
+                yield kind, item
+            self.commit()
+            self.stopped.wait(self.interval)
+
+    def poll(self):
+        '''Fetch the items added since the last committed poll, returning (kind, item) tuples oldest first.
+
+        The cursor is advanced in memory only; commit() persists it.
+        '''
+        polled_at = time.time()
+        return self.__batch__(dict((kind, self.__fetch_new__(kind)) for kind in self.kinds), polled_at)
+
+    def commit(self):
+        '''Advance the cursor past the items returned by the last poll and checkpoint it to disk.'''
+        if self.pending == None:
+            return
+        for kind, keys in self.pending.items():
+            self.cursors[kind] = (keys + self.cursors[kind])[:self.rpp]
+        self.pending = None
+        self.__save__()
+
+    def stop(self):
+        '''Stop following once the current batch has been yielded.'''
+        self.stopped.set()
+
+    def reset(self):
+        '''Discard the persisted cursor so that following restarts from the newest page.'''
+        self.cursors = dict((kind, []) for kind in self.kinds)
+        self.pending = None
+        try:
+            os.remove(self.__filename__())
+        except OSError:
+            pass
+
+    def __adapt__(self, pending, polled_at):
+        kind = NetworkFollower.BLOCKS if NetworkFollower.BLOCKS in pending else self.kinds[0]
+        observed = len(pending[kind])
+        if self.polled_at != None and observed > 0:
+            block_interval = (polled_at - self.polled_at) / observed
+            if self.block_interval == None:
+                self.block_interval = block_interval
+            else:
+                self.block_interval += NetworkFollower.SMOOTHING * (block_interval - self.block_interval)
+            self.interval = self.block_interval
+        elif self.polled_at != None:
+            self.interval *= NetworkFollower.BACKOFF
+        self.interval = min(max(self.interval, self.min_interval), self.max_interval)
+        self.polled_at = polled_at
+
+    def __batch__(self, new, polled_at):
+        batch = []
+        pending = {}
+        for kind in self.kinds:
+            pending[kind] = [item_key(item) for item in new[kind]]
+            batch.extend((kind, item) for item in reversed(new[kind]))
+        self.__adapt__(pending, polled_at)
+        self.pending = pending
+        return batch
+
+    def __collect__(self, response, seen, keys, items):
+        for item in response:
+            key = item_key(item)
+            if key in seen:
+                return True
+            if key not in keys:
+                keys.add(key)
+                items.append(item)
+        return len(response) < self.rpp or not seen
+
+    def __fetch_new__(self, kind):
+        seen = set(self.cursors[kind])
+        items = []
+        keys = set()
+        for page in range(1, self.max_pages + 1):
+            status, _, response = self.__fetch_page__(kind, self.__page_params__(page))
+            if status != 200:
+                raise Exception('failed to fetch {} for network {}; status: {}'.format(kind, self.network_id, status))
+            if self.__collect__(response, seen, keys, items):
+                return items
+        logging.warning('stopped following {} for network {} after {} pages'.format(kind, self.network_id, self.max_pages))
+        return items
+
+    def __fetch_page__(self, kind, params):
+        return getattr(self.client, 'fetch_network_{}'.format(kind))(self.network_id, params)
+
+    def __load__(self):
+        try:
+            with open(self.__filename__(), 'r') as f:
+                checkpoint = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        for kind in self.kinds:
+            self.cursors[kind] = checkpoint.get('cursors', {}).get(kind, [])
+        self.block_interval = checkpoint.get('block_interval', None)
+        if self.block_interval != None:
+            self.interval = min(max(self.block_interval, self.min_interval), self.max_interval)
+        logging.info('resuming network {} follower from checkpoint'.format(self.network_id))
+
+    def __save__(self):
+        checkpoint = {
+            'network_id': self.network_id,
+            'cursors': self.cursors,
+            'block_interval': self.block_interval,
+            'updated_at': time.time(),
+        }
+        try:
+            write_json(self.__filename__(), checkpoint)
+        except (IOError, OSError) as e:
+            logging.warning('failed to checkpoint network {} follower; {}'.format(self.network_id, e))
+
+    def __page_params__(self, page):
+        params = dict(self.params)
+        params.update(page=page, rpp=self.rpp)
+        return params
+
+    def __filename__(self):
+        name = '{}:{}:{}'.format(self.network_id, ','.join(self.kinds), json.dumps(self.params, sort_keys=True))
+        key = hashlib.sha256(name.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, '{}.json'.format(key))
@@ -0,0 +1,122 @@
+'''Pipelined, multi-worker publish engine for the message bus.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import logging
+import threading
+
+from concurrent.futures import Future
+from queue import Queue
+
+
+class Publisher(object):
+    '''Publishes messages on a pool of workers arranged as a two-stage pipeline.
+
+    The first stage adds each message to IPFS and the second stage registers
+    the resulting hash with the on-chain registry contract, so uploads and
+    contract executions for different messages overlap. Both stages are fed
+    by bounded queues; publish() blocks once the upload queue is full.
+    '''
+
+    DEFAULT_QUEUE_SIZE = 64
+    DEFAULT_WORKERS = 4
+
+    def __init__(self, message_bus, workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.message_bus = message_bus
+        self.uploads = Queue(maxsize=queue_size)
+        self.registrations = Queue(maxsize=queue_size)
+        self.outstanding = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.threads = []
+        for i in range(workers):
+            self.__start__(self.__upload__, 'prvd-publisher-upload-{}'.format(i))
+            self.__start__(self.__register__, 'prvd-publisher-register-{}'.format(i))
+
+    def publish(self, subject, msg, **kwargs):
+        '''Enqueue a message; returns a future resolving to the IPFS hash and contract execution status.'''
+        future = Future()
+        with self.cond:
+            if self.closed:
+                raise Exception('unable to publish message using closed publisher')
+            self.outstanding += 1
+        self.uploads.put((future, subject, msg, kwargs))
+        return future
+
+    def flush(self, timeout=None):
+        '''Wait for all outstanding messages to be published; returns False if the timeout elapsed first.'''
+        with self.cond:
+            if self.outstanding > 0:
+                self.cond.wait_for(lambda: self.outstanding == 0, timeout)
+            return self.outstanding == 0
+
+    drain = flush
+
+    def close(self):
+        '''Publish all outstanding messages and stop the workers.'''
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+        self.flush()
+        for _ in range(len(self.threads) // 2):
+            self.uploads.put(None)
+            self.registrations.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def __start__(self, target, name):
+        thread = threading.Thread(target=target, name=name)
+        thread.daemon = True
+        thread.start()
+        self.threads.append(thread)
+
+    def __upload__(self):
+        while True:
+            job = self.uploads.get()
+            if job == None:
+                break
+            future, subject, msg, kwargs = job
+            if not future.set_running_or_notify_cancel():
+                self.__done__()
+                continue
+            try:
+                msghash = self.message_bus.add_message(msg, **kwargs)
+            except Exception as e:
+                logging.warning('failed to add message on subject: {} to IPFS; {}'.format(subject, e))
+                future.set_exception(e)
+                self.__done__()
+                continue
+            self.registrations.put((future, subject, msghash))
+
+    def __register__(self):
+        while True:
+            job = self.registrations.get()
+            if job == None:
+                break
+            future, subject, msghash = job
+            try:
+                status = self.message_bus.register_message(subject, msghash)
+                future.set_result((msghash, status))
+            except Exception as e:
+                logging.warning('failed to register message on subject: {}; {}'.format(subject, e))
+                future.set_exception(e)
+            self.__done__()
+
+    def __done__(self):
+        with self.cond:
+            self.outstanding -= 1
+            if self.outstanding == 0:
+                self.cond.notify_all()
@@ -0,0 +1,252 @@
+'''Compact, slotted record models for Goldmine and Ident resources.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+from .codec import DEFAULT_CODEC
+
+EMPTY_ARRAY = b'[]'
+EMPTY_OBJECT = b'{}'
+
+
+def record_slots(fields, lazy_fields):
+    '''Return the __slots__ of a record class with the given eager and lazily decoded fields.'''
+    return tuple(fields) + tuple('_{}'.format(name) for name in lazy_fields)
+
+
+class LazyField(object):
+    '''Descriptor for a nested field kept encoded until it is first accessed.'''
+
+    def __init__(self, name):
+        self.name = name
+        self.slot = '_{}'.format(name)
+
+    def __get__(self, record, owner=None):
+        if record == None:
+            return self
+        value = getattr(record, self.slot)
+        if isinstance(value, bytes):
+            value = record._codec.loads(value)
+            setattr(record, self.slot, value)
+        return value
+
+
+class Record(object):
+    '''Read-only view of an API resource which stores its fields in slots.
+
+    FIELDS are stored as decoded; LAZY_FIELDS, typically nested objects such
+    as params and config, are kept as encoded bytes until first accessed,
+    and any other fields of the resource are kept encoded together and
+    returned by extra. Values of SHARED_FIELDS, such as network and
+    application ids, are deduplicated across the records converted by one
+    call to from_list, or within a bounded table by iter.
+
+    Records support item access and get() with the resource's field names,
+    so they may be passed where a decoded dict is expected; to_dict()
+    returns the resource as a dict, omitting its null fields.
+    '''
+
+    FIELDS = ()
+    LAZY_FIELDS = ()
+    SHARED_FIELDS = ()
+    KNOWN_FIELDS = frozenset()
+    LAZY_SLOTS = ()
+    MAX_SHARED_VALUES = 65536
+
+    __slots__ = ('_extra', '_codec')
+
+    def __init_subclass__(cls, **kwargs):
+        super(Record, cls).__init_subclass__(**kwargs)
+        for name in cls.LAZY_FIELDS:
+            setattr(cls, name, LazyField(name))
+        cls.LAZY_SLOTS = tuple(zip(cls.LAZY_FIELDS, record_slots((), cls.LAZY_FIELDS)))
+        cls.KNOWN_FIELDS = frozenset(cls.FIELDS + cls.LAZY_FIELDS)
+
+    def __init__(self, item, codec=None, shared=None):
+        self._codec = codec if codec != None else DEFAULT_CODEC
+        get = item.get
+        for name in self.FIELDS:
+            setattr(self, name, get(name))
+        if shared != None:
+            for name in self.SHARED_FIELDS:
+                value = getattr(self, name)
+                if isinstance(value, str):
+                    setattr(self, name, shared.setdefault(value, value))
+        for name, slot in self.LAZY_SLOTS:
+            setattr(self, slot, self.__encode__(get(name)))
+        unknown = item.keys() - self.KNOWN_FIELDS
+        self._extra = self.__encode__(dict((key, item[key]) for key in unknown)) if len(unknown) > 0 else None
+
+    @classmethod
+    def from_list(cls, items, codec=None):
+        '''Convert the decoded items of a list response to records.'''
+        shared = {}
+        return [cls(item, codec, shared) for item in items]
+
+    @classmethod
+    def iter(cls, items, codec=None):
+        '''Convert each item yielded by the given iterable, e.g. an iter_* or stream_* call, to a record.'''
+        shared = {}
+        for item in items:
+            if len(shared) >= Record.MAX_SHARED_VALUES:
+                shared.clear()
+            yield cls(item, codec, shared)
+
+    @property
+    def extra(self):
+        '''Return the fields of the resource which are not modelled by this record class.'''
+        extra = self._extra
+        if isinstance(extra, bytes):
+            extra = self._extra = self._codec.loads(extra)
+        return extra if extra != None else {}
+
+    def get(self, key, default=None):
+        if key in self.KNOWN_FIELDS:
+            value = getattr(self, key)
+            return value if value != None else default
+        return self.extra.get(key, default)
+
+    def to_dict(self):
+        '''Return the resource as a dict of its decoded, non-null fields.'''
+        item = dict(self.extra)
+        for name in self.FIELDS + self.LAZY_FIELDS:
+            value = getattr(self, name)
+            if value != None:
+                item[name] = value
+        return item
+
+    def __getitem__(self, key):
+        if key in self.KNOWN_FIELDS:
+            return getattr(self, key)
+        return self.extra[key]
+
+    def __contains__(self, key):
+        if key in self.KNOWN_FIELDS:
+            return getattr(self, key) != None
+        return key in self.extra
+
+    def __repr__(self):
+        return '{}(id={!r})'.format(type(self).__name__, self.get('id', None) or self.get('hash', None))
+
+    def __encode__(self, value):
+        '''Encode a nested object or array; scalars are kept as they are.'''
+        if not isinstance(value, (dict, list)):
+            return value
+        if len(value) == 0:
+            return EMPTY_OBJECT if isinstance(value, dict) else EMPTY_ARRAY
+        encoded = self._codec.dumps(value)
+        if isinstance(encoded, str):
+            return encoded.encode('utf-8')
+        # copy, since orjson returns small documents in oversized buffers
+        return bytes(memoryview(encoded))
+
+
+class Account(Record):
+    '''Goldmine account.'''
+
+    FIELDS = ('id', 'created_at', 'network_id', 'application_id', 'user_id', 'wallet_id', 'address', 'type')
+    LAZY_FIELDS = ('params',)
+    SHARED_FIELDS = ('network_id', 'application_id', 'user_id', 'wallet_id', 'type')
+
+    __slots__ = record_slots(FIELDS, LAZY_FIELDS)
+
+
+class Block(Record):
+    '''Block of a Goldmine network.'''
+
+    FIELDS = ('id', 'hash', 'number', 'parent_hash', 'timestamp', 'miner', 'size', 'gas_limit', 'gas_used', 'difficulty')
+    LAZY_FIELDS = ('transactions', 'uncles')
+    SHARED_FIELDS = ('miner',)
+
+    __slots__ = record_slots(FIELDS, LAZY_FIELDS)
+
+
+class Connector(Record):
+    '''Goldmine connector.'''
+
+    FIELDS = ('id', 'created_at', 'application_id', 'network_id', 'name', 'type', 'status', 'description')
+    LAZY_FIELDS = ('config',)
+    SHARED_FIELDS = ('application_id', 'network_id', 'type', 'status')
+
+    __slots__ = record_slots(FIELDS, LAZY_FIELDS)
+
+
+class Contract(Record):
+    '''Goldmine contract.'''
+
+    FIELDS = ('id', 'created_at', 'application_id', 'network_id', 'contract_id', 'transaction_id', 'name', 'address')
+    LAZY_FIELDS = ('params',)
+    SHARED_FIELDS = ('application_id', 'network_id', 'contract_id')
+
+    __slots__ = record_slots(FIELDS, LAZY_FIELDS)
+
+
+class Network(Record):
+    '''Goldmine network.'''
+
+    FIELDS = ('id', 'created_at', 'application_id', 'user_id', 'name', 'description', 'is_production', 'cloneable',
+              'enabled', 'chain_id', 'sidechain_id', 'network_id')
+    LAZY_FIELDS = ('config', 'stats')
+    SHARED_FIELDS = ('application_id', 'user_id', 'sidechain_id', 'network_id')
+
+    __slots__ = record_slots(FIELDS, LAZY_FIELDS)
+
+
+class Token(Record):
+    '''Goldmine token contract.'''
+
+    FIELDS = ('id', 'created_at', 'application_id', 'network_id', 'contract_id', 'sale_contract_id', 'name', 'symbol',
+              'decimals', 'address', 'sale_address')
+    SHARED_FIELDS = ('application_id', 'network_id')
+
+    __slots__ = FIELDS
+
+
+class Transaction(Record):
+    '''Goldmine transaction.'''
+
+    FIELDS = ('id', 'created_at', 'network_id', 'application_id', 'user_id', 'account_id', 'wallet_id', 'signer',
+              'to', 'value', 'hash', 'status', 'ref', 'block', 'block_timestamp', 'description')
+    LAZY_FIELDS = ('params', 'data', 'traces')
+    SHARED_FIELDS = ('network_id', 'application_id', 'user_id', 'account_id', 'wallet_id', 'signer', 'to', 'status')
+
+    __slots__ = record_slots(FIELDS, LAZY_FIELDS)
+
+
+class Wallet(Record):
+    '''Goldmine wallet.'''
+
+    FIELDS = ('id', 'created_at', 'network_id', 'application_id', 'user_id', 'address', 'purpose')
+    SHARED_FIELDS = ('network_id', 'application_id', 'user_id')
+
+    __slots__ = FIELDS
+
+
+class Application(Record):
+    '''Ident application.'''
+
+    FIELDS = ('id', 'created_at', 'network_id', 'user_id', 'name', 'description', 'hidden')
+    LAZY_FIELDS = ('config',)
+    SHARED_FIELDS = ('network_id', 'user_id')
+
+    __slots__ = record_slots(FIELDS, LAZY_FIELDS)
+
+
+class User(Record):
+    '''Ident user.'''
+
+    FIELDS = ('id', 'created_at', 'application_id', 'name', 'first_name', 'last_name', 'email', 'permissions')
+    SHARED_FIELDS = ('application_id',)
+
+    __slots__ = FIELDS
@@ -0,0 +1,76 @@
+'''Persistent on-disk cache of resolved message bus applications, contracts and connectors.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+from .cache_files import cache_dir, write_json
+
+
+class ResolutionCache(object):
+    '''Caches message bus resolution results on disk, keyed by application id.
+
+    Each application is stored as a JSON document in the cache directory and
+    is considered stale once it is older than the configured TTL. Writes are
+    atomic, so several processes may share one cache directory.
+    '''
+
+    DEFAULT_TTL = 3600
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL):
+        self.path = os.path.join(cache_dir(path), 'resolution')
+        self.ttl = ttl
+
+    def get(self, application_id):
+        '''Return the cached resolution for the given application id, or None if it is missing or stale.'''
+        try:
+            with open(self.__filename__(application_id), 'r') as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if time.time() - entry.get('resolved_at', 0) > self.ttl:
+            logging.info('cached message bus resolution for application_id: {} is stale'.format(application_id))
+            return None
+        return entry
+
+    def set(self, application_id, application, contract, connector, connectors=None):
+        '''Persist the resolution for the given application id.'''
+        entry = {
+            'application': application,
+            'contract': contract,
+            'connector': connector,
+            'connectors': connectors or [connector],
+            'resolved_at': time.time(),
+        }
+        try:
+            write_json(self.__filename__(application_id), entry)
+        except (IOError, OSError) as e:
+            logging.warning('failed to cache message bus resolution for application_id: {}; {}'.format(application_id, e))
+
+    def invalidate(self, application_id):
+        '''Remove the cached resolution for the given application id.'''
+        try:
+            os.remove(self.__filename__(application_id))
+            logging.info('invalidated cached message bus resolution for application_id: {}'.format(application_id))
+        except OSError:
+            pass
+
+    def __filename__(self, application_id):
+        key = hashlib.sha256(application_id.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, '{}.json'.format(key))
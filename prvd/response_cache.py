@@ -0,0 +1,150 @@
+'''In-memory TTL/LRU cache for API responses.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import copy
+import fnmatch
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class ResponseCache(object):
+    '''Caches successful GET responses in memory.
+
+    Entries live for the TTL of the first pattern in ttls matching the request
+    uri (fnmatch syntax, e.g. 'contracts/*'), or default_ttl otherwise; a TTL
+    of 0 disables caching for matching uris. Once the cached responses exceed
+    max_size bytes, the least recently used are evicted. Expired entries which
+    carried an ETag are revalidated with If-None-Match, identical concurrent
+    requests are coalesced into one upstream request and writes to a path
+    invalidate cached responses from the same host for that path, its
+    ancestors and descendants. A response to a request in flight when a
+    write invalidates its path is returned to its callers but not cached.
+    Every caller receives its own copy of a cached response, so callers may
+    mutate what they are given.
+    '''
+
+    DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+    DEFAULT_TTL = 60
+
+    def __init__(self, ttls=None, default_ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, uri, fetch, base_url=None):
+        '''Return the cached response for key, calling fetch(headers) with any conditional request headers on a miss.
+
+        fetch must return the status, headers, decoded response and size in bytes of the response.
+        '''
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry != None and entry['expires_at'] > time.time():
+                self.entries.move_to_end(key)
+                return copy.deepcopy(entry['value'])
+            request = self.inflight.get(key, None)
+            leader = request == None
+            if leader:
+                request = self.inflight[key] = {
+                    'future': Future(),
+                    'base_url': base_url,
+                    'path': uri.strip('/'),
+                    'invalidated': False,
+                }
+        future = request['future']
+
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            headers = {'if-none-match': entry['etag']} if entry != None and entry['etag'] != None else {}
+            status, response_headers, response, size = fetch(headers)
+            if status == 304 and entry != None:
+                value = entry['value']
+                self.__store__(key, request, uri, value, entry['etag'], entry['size'])
+            else:
+                value = (status, response_headers, response)
+                if status == 200:
+                    self.__store__(key, request, uri, value, response_headers.get('etag', None), size)
+            future.set_result(value)
+            return copy.deepcopy(value)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                if self.inflight.get(key, None) is request:
+                    del self.inflight[key]
+
+    def invalidate(self, uri, base_url=None):
+        '''Evict cached responses for the given path, its ancestors and its descendants from base_url, or from every host when base_url is None.'''
+        path = uri.strip('/')
+        with self.lock:
+            for key in [key for key, entry in self.entries.items() if self.__matches__(entry, base_url, path)]:
+                self.__evict__(key)
+            # responses to requests already in flight for related paths may predate the write
+            for key in [key for key, request in self.inflight.items() if self.__matches__(request, base_url, path)]:
+                self.inflight.pop(key)['invalidated'] = True
+
+    def clear(self):
+        '''Evict all cached responses.'''
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def ttl(self, uri):
+        '''Return the TTL, in seconds, of responses for the given uri.'''
+        for pattern, ttl in self.ttls.items():
+            if fnmatch.fnmatchcase(uri, pattern):
+                return ttl
+        return self.default_ttl
+
+    def __store__(self, key, request, uri, value, etag, size):
+        ttl = self.ttl(uri)
+        if ttl <= 0 or size > self.max_size:
+            return
+        with self.lock:
+            if request['invalidated']:
+                return
+            if key in self.entries:
+                self.__evict__(key)
+            self.entries[key] = {
+                'value': value,
+                'etag': etag,
+                'expires_at': time.time() + ttl,
+                'base_url': request['base_url'],
+                'path': uri.strip('/'),
+                'size': size,
+            }
+            self.size += size
+            while self.size > self.max_size:
+                self.__evict__(next(iter(self.entries)))
+
+    def __evict__(self, key):
+        entry = self.entries.pop(key)
+        self.size -= entry['size']
+
+    def __matches__(self, entry, base_url, path):
+        return (base_url == None or entry['base_url'] == base_url) and self.__related__(entry['path'], path)
+
+    def __related__(self, a, b):
+        return a == b or a.startswith(b + '/') or b.startswith(a + '/')
@@ -0,0 +1,279 @@
+'''Client-side rate limiting and priority scheduling of API requests.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import asyncio
+import bisect
+import contextvars
+import fnmatch
+import itertools
+import logging
+import threading
+import time
+
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_priority = contextvars.ContextVar('prvd_priority', default=None)
+
+
+def retry_after(headers):
+    '''Return the number of seconds requested by the Retry-After header of the given response headers, or None.'''
+    value = headers.get('retry-after', None) if headers != None else None
+    if value == None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket(object):
+    '''Token bucket whose rate adapts to throttling; a rate of None is unlimited.'''
+
+    ADDITIVE_INCREASE = 1.0
+    MULTIPLICATIVE_DECREASE = 0.5
+    DECREASE_INTERVAL = 1.0
+
+    def __init__(self, rate=None, burst=None, min_rate=1.0):
+        self.ceiling = rate
+        self.rate = rate
+        self.burst = burst if burst != None else max(rate or 1, 1)
+        self.min_rate = min_rate
+        self.tokens = self.burst
+        self.updated = time.time()
+        self.blocked_until = 0
+        self.throttled = 0
+        self.granted = deque()
+
+    def delay(self, now):
+        '''Return the seconds until a token is available.'''
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.rate == None:
+            return 0
+        self.__refill__(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self.granted.append(now)
+        while self.granted[0] < now - 1:
+            self.granted.popleft()
+        if self.rate != None:
+            self.tokens -= 1
+
+    def throttle(self, now, retry_after=None):
+        '''Halve the rate, starting from the observed rate if unlimited, and block until retry_after has elapsed.
+
+        Responses to requests already in flight when the rate was last halved
+        are throttled by the same overload, so the rate is halved at most once
+        per DECREASE_INTERVAL.
+        '''
+        if retry_after != None:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+        if now < self.throttled + TokenBucket.DECREASE_INTERVAL:
+            return
+        self.throttled = now
+        self.__refill__(now)
+        rate = self.rate if self.rate != None else len(self.granted)
+        self.rate = max(rate * TokenBucket.MULTIPLICATIVE_DECREASE, self.min_rate)
+        self.burst = max(min(self.burst, self.rate), 1)
+        self.tokens = min(self.tokens, 0)
+
+    def recover(self, now):
+        '''Raise the rate additively, back to the configured rate or to unlimited once it no longer constrains requests.'''
+        if self.rate == None or self.rate == self.ceiling:
+            return
+        self.__refill__(now)
+        self.rate += TokenBucket.ADDITIVE_INCREASE
+        if self.ceiling != None and self.rate >= self.ceiling:
+            self.rate = self.ceiling
+            self.burst = max(self.ceiling, 1)
+        elif self.ceiling == None and self.rate > 2 * len(self.granted):
+            self.rate = None
+            self.tokens = self.burst
+        else:
+            self.burst = max(self.rate, 1)
+
+    def __refill__(self, now):
+        if self.rate != None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class Scheduler(object):
+    '''Rate limits API requests per host and per endpoint, granting waiting requests in priority order.
+
+    Each host is limited to rate requests per second and each endpoint, a
+    method and templated uri such as 'POST contracts/{id}/execute', to the
+    rate of the first pattern in endpoint_rates it matches (fnmatch syntax);
+    None is unlimited. A 429 response halves the rate of its endpoint and a
+    503 response the rate of its host, both honouring any Retry-After
+    header; rates then recover additively with each successful response.
+    Requests waiting for a token are granted in priority order, so reads,
+    which default to PRIORITY_INTERACTIVE, are not starved by writes, which
+    default to PRIORITY_BULK.
+    '''
+
+    DEFAULT_MIN_RATE = 1.0
+    POLL_INTERVAL = 0.005
+
+    def __init__(self, rate=None, burst=None, endpoint_rates=None, min_rate=DEFAULT_MIN_RATE):
+        self.rate = rate
+        self.burst = burst
+        self.endpoint_rates = endpoint_rates or {}
+        self.min_rate = min_rate
+        self.hosts = {}
+        self.endpoints = {}
+        self.queues = {}
+        self.sequence = itertools.count()
+        self.cond = threading.Condition()
+
+    def priority(self, priority):
+        '''Return a context manager applying the given priority to requests made within it, overriding the client's.'''
+        return PriorityContext(priority)
+
+    def acquire(self, host, method, endpoint, priority=None, metrics=None):
+        '''Block until a request to the given endpoint may be made; returns the seconds waited.'''
+        started = time.time()
+        with self.cond:
+            waiter, depth = self.__enqueue__(host, method, endpoint, priority)
+            try:
+                while True:
+                    delay = self.__grant__(waiter)
+                    if delay == 0:
+                        break
+                    self.cond.wait(delay)
+            finally:
+                self.__dequeue__(waiter)
+        return self.__waited__(waiter, started, depth, metrics)
+
+    async def acquire_async(self, host, method, endpoint, priority=None, metrics=None):
+        '''Wait without blocking the event loop until a request to the given endpoint may be made; returns the seconds waited.'''
+        started = time.time()
+        with self.cond:
+            waiter, depth = self.__enqueue__(host, method, endpoint, priority)
+        try:
+            while True:
+                with self.cond:
+                    delay = self.__grant__(waiter)
+                if delay == 0:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            with self.cond:
+                self.__dequeue__(waiter)
+        return self.__waited__(waiter, started, depth, metrics)
+
+    def record(self, host, method, endpoint, status, headers):
+        '''Adapt the rates of the given host and endpoint to the status of a response.'''
+        now = time.time()
+        with self.cond:
+            if status == 429 or status == 503:
+                bucket = self.endpoints[(host, method, endpoint)] if status == 429 else self.hosts[host]
+                bucket.throttle(now, retry_after(headers))
+                logging.warning('throttled {} {} on {}; status: {}; rate: {:.2f}/s'.format(method, endpoint, host, status, bucket.rate))
+            elif status < 500:
+                self.hosts[host].recover(now)
+                self.endpoints[(host, method, endpoint)].recover(now)
+            self.cond.notify_all()
+
+    def queue_depth(self, host=None):
+        '''Return the number of requests waiting for a token per priority, for the given host or all hosts.'''
+        depth = {}
+        with self.cond:
+            for queue_host, queue in self.queues.items():
+                if host == None or queue_host == host:
+                    for waiter in queue:
+                        depth[waiter[0]] = depth.get(waiter[0], 0) + 1
+        return depth
+
+    def __enqueue__(self, host, method, endpoint, priority):
+        if priority == None:
+            priority = PRIORITY_INTERACTIVE if method in READ_METHODS else PRIORITY_BULK
+        context_priority = _priority.get()
+        if context_priority != None:
+            priority = context_priority
+        if host not in self.hosts:
+            self.hosts[host] = TokenBucket(self.rate, self.burst, self.min_rate)
+        key = (host, method, endpoint)
+        if key not in self.endpoints:
+            self.endpoints[key] = TokenBucket(self.__endpoint_rate__(method, endpoint), None, self.min_rate)
+        queue = self.queues.setdefault(host, [])
+        waiter = (priority, next(self.sequence), key)
+        bisect.insort(queue, waiter)
+        return waiter, len(queue) - 1
+
+    def __dequeue__(self, waiter):
+        queue = self.queues[waiter[2][0]]
+        queue.remove(waiter)
+        self.cond.notify_all()
+
+    def __grant__(self, waiter):
+        now = time.time()
+        host = self.hosts[waiter[2][0]]
+        host_delay = host.delay(now)
+        endpoint = self.endpoints[waiter[2]]
+        if host_delay == 0:
+            for other in self.queues[waiter[2][0]]:
+                if other is waiter:
+                    break
+                if self.endpoints[other[2]].delay(now) == 0:
+                    return Scheduler.POLL_INTERVAL
+        delay = max(host_delay, endpoint.delay(now))
+        if delay > 0:
+            return delay
+        host.take(now)
+        endpoint.take(now)
+        return 0
+
+    def __endpoint_rate__(self, method, endpoint):
+        name = '{} {}'.format(method, endpoint)
+        for pattern, rate in self.endpoint_rates.items():
+            if fnmatch.fnmatch(name, pattern):
+                return rate
+        return None
+
+    def __waited__(self, waiter, started, depth, metrics):
+        waited = time.time() - started
+        if metrics != None and metrics.enabled:
+            _, method, endpoint = waiter[2]
+            metrics.record_schedule(method, endpoint, waiter[0], waited, depth)
+        return waited
+
+
+class PriorityContext(object):
+    '''Context manager applying a scheduling priority to the requests made within it.'''
+
+    def __init__(self, priority):
+        self.priority = priority
+
+    def __enter__(self):
+        self.token = _priority.set(self.priority)
+        return self
+
+    def __exit__(self, *args):
+        _priority.reset(self.token)
+        return False
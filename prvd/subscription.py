@@ -0,0 +1,103 @@
+'''Subscriptions to the messages published on a message bus subject.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import hashlib
+import os
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .envelope import Envelope, batch_subject
+from .network_follower import NetworkFollower
+
+
+class Subscription(NetworkFollower):
+    '''Yields the IPFS hash and content of each message published on a subject, in publication order.
+
+    New messages are discovered by following the transactions of the message
+    bus application and selecting executions of the registry contract's
+    publish method on the subject; failed executions are skipped. Message
+    content is fetched from IPFS by a pool of concurrency workers, at most
+    prefetch messages ahead of the consumer. Envelopes registered on the
+    subject's batch subject are unpacked unless unpack is False, yielding
+    each of their messages in turn with the envelope's hash.
+    '''
+
+    CONTRACT_METHOD_PUBLISH = 'publish'
+    DEFAULT_CONCURRENCY = 4
+    DEFAULT_PREFETCH = 16
+    TRANSACTION_STATUS_FAILED = 'failed'
+
+    def __init__(self, message_bus, subject, prefetch=DEFAULT_PREFETCH, concurrency=DEFAULT_CONCURRENCY, unpack=True, **kwargs):
+        if message_bus.contract == None:
+            raise Exception('unable to subscribe to subject without resolution of an on-chain registry contract')
+        self.message_bus = message_bus
+        self.subject = subject
+        self.prefetch = max(prefetch, 1)
+        self.concurrency = concurrency
+        self.unpack = unpack
+        super(Subscription, self).__init__(message_bus, message_bus.contract.get('network_id', None),
+                                           kinds=(NetworkFollower.TRANSACTIONS,), **kwargs)
+
+    def __iter__(self):
+        return self.messages()
+
+    def messages(self):
+        '''Yield an (IPFS hash, message) tuple for each new message on the subject until stopped.'''
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            while not self.stopped.is_set():
+                hashes = deque(self.__published__(self.poll()))
+                window = deque()
+                while hashes or window:
+                    while hashes and len(window) < self.prefetch:
+                        msghash, batched = hashes.popleft()
+                        window.append((msghash, batched, executor.submit(self.message_bus.fetch_message, msghash)))
+                    msghash, batched, msg = window.popleft()
+                    for msg in self.__unpack__(msg.result(), batched):
+                        yield msghash, msg
+                self.commit()
+                self.stopped.wait(self.interval)
+        finally:
+            executor.shutdown(wait=False)
+
+    def __fetch_page__(self, kind, params):
+        return self.message_bus.fetch_transactions(params)
+
+    def __unpack__(self, content, batched):
+        if batched and self.unpack:
+            return Envelope(content)
+        return (content,)
+
+    def __published__(self, batch):
+        address = (self.message_bus.contract.get('address', None) or '').lower()
+        batched = batch_subject(self.subject)
+        for _, tx in batch:
+            if tx.get('status', None) == Subscription.TRANSACTION_STATUS_FAILED:
+                continue
+            to = tx.get('to', None)
+            if to != None and address and to.lower() != address:
+                continue
+            params = tx.get('params', None) or {}
+            if params.get('method', None) != Subscription.CONTRACT_METHOD_PUBLISH:
+                continue
+            args = params.get('params', None) or []
+            if len(args) == 2 and args[0] in (self.subject, batched):
+                yield args[1], args[0] == batched
+
+    def __filename__(self):
+        name = '{}:{}:{}'.format(self.message_bus.application_id, self.message_bus.contract.get('id', None), self.subject)
+        key = hashlib.sha256(name.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, 'subscription-{}.json'.format(key))
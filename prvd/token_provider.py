@@ -0,0 +1,259 @@
+'''API token providers which cache claims and refresh tokens before they expire.'''
+
+#  Copyright 2017-2022 Provide Technologies Inc.
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+
+import functools
+import logging
+import random
+import threading
+import time
+
+DECODE_OPTIONS = {
+    'verify_signature': False,
+    'verify_exp': False,
+    'verify_nbf': False,
+    'verify_iat': False,
+    'verify_aud': False,
+}
+
+
+@functools.lru_cache(maxsize=64)
+def decode_claims(token):
+    '''Return the claims of the given JWT without verifying its signature; the result is cached and must not be modified.'''
+    import jwt
+
+    return jwt.decode(token, options=DECODE_OPTIONS, algorithms=None)
+
+
+def token_provider(token):
+    '''Return the given TokenProvider, or a TokenProvider for the given token string; None if token is None.'''
+    if token == None or isinstance(token, TokenProvider):
+        return token
+    return TokenProvider(token)
+
+
+class TokenProvider(object):
+    '''Supplies the bearer token of API requests.
+
+    The base provider supplies a fixed token. Clients call token() for every
+    request, which must not block, and call invalidate() with the token of a
+    request which was rejected as unauthorized.
+    '''
+
+    def __init__(self, token):
+        self.current = token
+
+    def token(self):
+        '''Return the current token.'''
+        return self.current
+
+    def available(self):
+        '''Return whether token() returns without waiting.'''
+        return True
+
+    def claims(self):
+        '''Return the decoded claims of the current token.'''
+        token = self.token()
+        return decode_claims(token) if token != None else {}
+
+    def invalidate(self, token):
+        '''Return a token to replace the given, rejected token, or None if there is none.'''
+        return None
+
+    def close(self):
+        '''Stop refreshing the token.'''
+        pass
+
+
+class RefreshingTokenProvider(TokenProvider):
+    '''Token provider which refreshes its token on a background thread before it expires.
+
+    refresh(refresh_token) is called with the most recent refresh token and
+    returns a new access token, or a dict such as an Ident token with an
+    access_token or token and optionally a refresh_token and expires_in.
+    The token is refreshed once refresh_ahead of its lifetime, at least
+    min_refresh_ahead seconds, remains before its exp claim or expires_in;
+    a token which expires neither way is never refreshed unless rejected.
+    Failed refreshes are retried with jittered, exponential backoff.
+
+    One provider may be shared by any number of clients and threads, which
+    then share one refresh. token() returns the current token without
+    waiting, except for the first token of a provider constructed without
+    one, for which it waits up to unauthorized_timeout seconds and then
+    raises the last refresh error. A rejected token is refreshed
+    immediately, and invalidate() waits up to unauthorized_timeout seconds
+    for the replacement.
+    '''
+
+    DEFAULT_REFRESH_AHEAD = 0.2
+    DEFAULT_MIN_REFRESH_AHEAD = 30
+    DEFAULT_RETRY_INTERVAL = 1
+    DEFAULT_MAX_RETRY_INTERVAL = 60
+    DEFAULT_UNAUTHORIZED_TIMEOUT = 10
+
+    def __init__(self, refresh, token=None, refresh_token=None,
+                 refresh_ahead=DEFAULT_REFRESH_AHEAD,
+                 min_refresh_ahead=DEFAULT_MIN_REFRESH_AHEAD,
+                 retry_interval=DEFAULT_RETRY_INTERVAL,
+                 max_retry_interval=DEFAULT_MAX_RETRY_INTERVAL,
+                 unauthorized_timeout=DEFAULT_UNAUTHORIZED_TIMEOUT):
+        super(RefreshingTokenProvider, self).__init__(None)
+        self.refresh = refresh
+        self.refresh_token = refresh_token
+        self.refresh_ahead = refresh_ahead
+        self.min_refresh_ahead = min_refresh_ahead
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.unauthorized_timeout = unauthorized_timeout
+        self.refresh_at = None
+        self.refreshes = 0
+        self.failures = 0
+        self.error = None
+        self.stopped = False
+        self.thread = None
+        self.cond = threading.Condition()
+        if token != None:
+            with self.cond:
+                self.__accept__(token)
+        else:
+            self.refresh_at = time.time()
+
+    @classmethod
+    def from_refresh_token(cls, refresh_token, token=None, **kwargs):
+        '''Return a provider which exchanges the given Ident refresh token for access tokens.'''
+        from .ident import Ident
+
+        def refresh(refresh_token):
+            ident = Ident(refresh_token)
+            try:
+                status, _, response = ident.create_token({'grant_type': 'refresh_token'})
+            finally:
+                ident.close()
+            if status >= 300:
+                raise Exception('failed to refresh API token; status: {}'.format(status))
+            return response
+
+        return cls(refresh, token=token, refresh_token=refresh_token, **kwargs)
+
+    @classmethod
+    def from_credentials(cls, email, password, **kwargs):
+        '''Return a provider which authenticates with the given Ident user credentials for each token.'''
+        from .ident import Ident
+
+        def refresh(refresh_token):
+            ident = Ident(None)
+            try:
+                status, _, response = ident.authenticate({'email': email, 'password': password})
+            finally:
+                ident.close()
+            if status >= 300:
+                raise Exception('failed to authenticate API token; status: {}'.format(status))
+            return response
+
+        return cls(refresh, **kwargs)
+
+    def token(self):
+        current = self.current
+        if current != None and self.thread != None:
+            return current
+        deadline = time.time() + self.unauthorized_timeout
+        with self.cond:
+            self.__start__()
+            while self.current == None and not self.stopped:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    if self.error != None:
+                        raise self.error
+                    raise Exception('unable to obtain API token within {} seconds'.format(self.unauthorized_timeout))
+                self.cond.wait(remaining)
+            return self.current
+
+    def available(self):
+        return self.current != None
+
+    def invalidate(self, token):
+        deadline = time.time() + self.unauthorized_timeout
+        with self.cond:
+            self.__start__()
+            refreshes = self.refreshes
+            if token == self.current:
+                self.refresh_at = time.time()
+                self.cond.notify_all()
+            while token == self.current and self.refreshes == refreshes and not self.stopped:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+            return self.current if self.current != token else None
+
+    def close(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+
+    def __accept__(self, result):
+        '''Adopt the token returned by refresh and schedule its refresh; the lock is held by the caller.'''
+        received = time.time()
+        expires_in = None
+        while isinstance(result, dict):
+            if result.get('refresh_token', None) != None:
+                self.refresh_token = result['refresh_token']
+            expires_in = result.get('expires_in', expires_in)
+            nested = result.get('token', None)
+            result = result.get('access_token', None) or nested
+        if not isinstance(result, str):
+            raise Exception('unable to refresh API token without an access token in the refresh response')
+
+        claims = decode_claims(result)
+        expires_at = claims.get('exp', None) or (received + expires_in if expires_in != None else None)
+        self.current = result
+        self.refreshes += 1
+        self.failures = 0
+        self.error = None
+        self.refresh_at = None
+        if expires_at != None:
+            lifetime = max(expires_at - (claims.get('iat', None) or received), 0)
+            ahead = min(max(lifetime * self.refresh_ahead, self.min_refresh_ahead), lifetime / 2)
+            self.refresh_at = expires_at - ahead * random.uniform(1, 1.1)
+        self.cond.notify_all()
+
+    def __run__(self):
+        while True:
+            with self.cond:
+                while not self.stopped and (self.refresh_at == None or self.refresh_at > time.time()):
+                    self.cond.wait(self.refresh_at - time.time() if self.refresh_at != None else None)
+                if self.stopped:
+                    return
+                refresh_token = self.refresh_token
+            try:
+                result = self.refresh(refresh_token)
+                with self.cond:
+                    self.__accept__(result)
+                logging.info('refreshed API token; next refresh in {} seconds'.format(
+                    round(self.refresh_at - time.time()) if self.refresh_at != None else None))
+            except Exception as e:
+                with self.cond:
+                    self.failures += 1
+                    self.error = e
+                    backoff = min(self.retry_interval * 2 ** (self.failures - 1), self.max_retry_interval)
+                    self.refresh_at = time.time() + random.uniform(backoff / 2, backoff)
+                    logging.warning('failed to refresh API token; retrying in {:.1f} seconds; {}'.format(
+                        self.refresh_at - time.time(), e))
+
+    def __start__(self):
+        if self.thread == None and not self.stopped:
+            self.thread = threading.Thread(target=self.__run__, name='prvd-token-refresh')
+            self.thread.daemon = True
+            self.thread.start()
@@ -19,7 +19,7 @@ with open('README.md', 'r') as fh:
 
 setuptools.setup(
     name='prvd',
-    version='0.2.1',
+    version='0.3.0',
     author='Kyle Thomas',
     author_email='kyle@provide.services',
     description='Provide python client',
@@ -27,11 +27,15 @@ setuptools.setup(
     long_description_content_type='text/markdown',
     url='https://github.com/provideservices/provide-python',
     packages=setuptools.find_packages(),
+    python_requires='>=3.7',
     install_requires=[
         'ipfshttpclient',
         'pyjwt',
         'requests',
     ],
+    extras_require={
+        'async': ['aiohttp'],
+    },
     classifiers=[
     ],
 )